@@ -1,8 +1,14 @@
 import datetime
-from typing import List, Optional
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 
 from base.database import Database, Row
-from base.utils import count_days_of_overlap, get_days_in_month, get_today_adjusted
+from base.utils import (
+    count_days_of_overlap,
+    get_days_in_month,
+    get_today_adjusted,
+    month_range,
+)
 
 
 def list_books(
@@ -10,35 +16,33 @@ def list_books(
 ) -> List[Row]:
     if month is not None:
         where = """
-          date_started <= :end_of_month
+          book_entries.date_started <= :end_of_month
           AND (
-            date_ended IS NULL
-            OR date_ended >= :start_of_month
+            book_entries.date_ended IS NULL
+            OR book_entries.date_ended >= :start_of_month
           )
         """
         values = {
             "start_of_month": f"{year}-{month:0>2}-01",
             "end_of_month": f"{year}-{month:0>2}-31",
         }
-        rows = db.select("book_entries", where=where, values=values)
     elif year is not None:
         where = """
-          date_started <= :end_of_year
+          book_entries.date_started <= :end_of_year
           AND (
-            date_ended IS NULL
-            OR date_ended >= :start_of_year
+            book_entries.date_ended IS NULL
+            OR book_entries.date_ended >= :start_of_year
           )
         """
         values = {
             "start_of_year": f"{year}-01-01",
             "end_of_year": f"{year}-12-31",
         }
-        rows = db.select("book_entries", where=where, values=values)
     else:
-        rows = db.select("book_entries")
+        where = "1"
+        values = {}
 
-    # TODO(2021-10-01): Make this more efficient using a JOIN.
-    return [_convert_entry(db, entry, year, month) for entry in rows]
+    return _select_entries(db, where, values, year, month)
 
 
 def finish_book(db: Database, pk: int, payload: dict) -> Row:
@@ -51,8 +55,8 @@ def finish_book(db: Database, pk: int, payload: dict) -> Row:
         db.update_by_pk("books", entry["book"], {"pages": pages})
 
     db.update_by_pk("book_entries", pk, payload)
-    entry = db.get_by_pk("book_entries", pk)
-    return _convert_entry(db, entry)
+    db.on_commit(lambda: invalidate_reading_stats(db.path))
+    return _get_entry(db, pk)
 
 
 def start_recommendation(db: Database, pk: int, payload: dict) -> Row:
@@ -63,7 +67,7 @@ def start_recommendation(db: Database, pk: int, payload: dict) -> Row:
         "book_recommendations", recommendation["id"], {"date_removed": date}
     )
 
-    entry = db.insert_and_get(
+    entry_id = db.insert(
         "book_entries",
         {
             "book": recommendation["book"],
@@ -74,7 +78,8 @@ def start_recommendation(db: Database, pk: int, payload: dict) -> Row:
             "rating": None,
         },
     )
-    return _convert_entry(db, entry)
+    db.on_commit(lambda: invalidate_reading_stats(db.path))
+    return _get_entry(db, entry_id)
 
 
 def start_book(db: Database, payload: dict) -> Row:
@@ -92,7 +97,7 @@ def start_book(db: Database, payload: dict) -> Row:
         },
     )
 
-    entry = db.insert_and_get(
+    entry_id = db.insert(
         "book_entries",
         {
             "book": book_id,
@@ -102,7 +107,150 @@ def start_book(db: Database, payload: dict) -> Row:
             "skimmed": False,
         },
     )
-    return _convert_entry(db, entry, date.year, date.month)
+    db.on_commit(lambda: invalidate_reading_stats(db.path))
+    return _get_entry(db, entry_id, date.year, date.month)
+
+
+# The reading statistics for each database path, along with the fingerprint of the
+# book tables at the time they were computed.
+_reading_stats: Dict[str, Tuple[Tuple[Any, ...], Dict[str, Any]]] = {}
+_reading_stats_lock = threading.Lock()
+
+
+def get_reading_stats(db: Database) -> Dict[str, Any]:
+    """
+    Returns reading statistics for every year and month and for all time, computed by
+    ``compute_reading_stats``.
+
+    The statistics are cached until a book is started or finished. As the book tables
+    can also be edited through the generic database API, the cache is additionally
+    checked against a fingerprint of the tables. The return value must not be modified.
+    """
+    fingerprint = _get_book_tables_fingerprint(db)
+    with _reading_stats_lock:
+        cached = _reading_stats.get(db.path)
+
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    stats = compute_reading_stats(db)
+    with _reading_stats_lock:
+        _reading_stats[db.path] = (fingerprint, stats)
+    return stats
+
+
+def invalidate_reading_stats(path: str) -> None:
+    """
+    Clears the cached reading statistics for the database at ``path``.
+
+    This must be called after the change to the book tables has been committed, or else
+    the statistics may be recomputed and cached from the old data.
+    """
+    with _reading_stats_lock:
+        _reading_stats.pop(path, None)
+
+
+def compute_reading_stats(db: Database) -> Dict[str, Any]:
+    """
+    Computes reading statistics in a single pass over every book entry.
+
+    The return value has a ``total`` field with the statistics for all time, and
+    ``years`` and ``months`` fields with lists of the statistics for each year and
+    month in which any reading happened, in chronological order.
+
+    Books, pages, fiction and ratings are counted in the period a book was finished,
+    and abandoned books in the period they were abandoned. ``value`` is the book's value
+    (as in ``list_books``) spread over the days it was read, like the ``books_read``
+    metric.
+    """
+    total = _new_rollup()
+    years: Dict[int, Dict[str, Any]] = {}
+    months: Dict[Tuple[int, int], Dict[str, Any]] = {}
+
+    def rollups(date: datetime.date) -> List[Dict[str, Any]]:
+        year = years.setdefault(date.year, _new_rollup())
+        month = months.setdefault((date.year, date.month), _new_rollup())
+        return [total, year, month]
+
+    for entry in _select_entries(db, "1", {}):
+        date_started = entry["date_started"]
+        date_ended = entry["date_ended"]
+        if date_ended is None:
+            continue
+
+        if entry["abandoned"]:
+            for rollup in rollups(date_ended):
+                rollup["abandoned"] += 1
+            continue
+
+        for rollup in rollups(date_ended):
+            rollup["books"] += 1
+            rollup["pages"] += entry["pages"] or 0
+            if entry["fiction"]:
+                rollup["fiction"] += 1
+            if entry["rating"] is not None:
+                rollup["ratings"] += 1
+                rollup["rating_total"] += entry["rating"]
+
+        days_read = (date_ended - date_started).days + 1
+        for month in month_range(date_started, date_ended):
+            end_of_month = month.replace(day=get_days_in_month(month.year, month.month))
+            n = count_days_of_overlap(month, end_of_month, date_started, date_ended)
+            value = entry["value"] * n / days_read
+            for rollup in rollups(month):
+                rollup["value"] += value
+
+    return {
+        "total": _finish_rollup(total),
+        "years": [
+            {"year": year, **_finish_rollup(rollup)}
+            for year, rollup in sorted(years.items())
+        ],
+        "months": [
+            {"year": year, "month": month, **_finish_rollup(rollup)}
+            for (year, month), rollup in sorted(months.items())
+        ],
+    }
+
+
+def _new_rollup() -> Dict[str, Any]:
+    return {
+        "books": 0,
+        "pages": 0,
+        "fiction": 0,
+        "abandoned": 0,
+        "value": 0.0,
+        "ratings": 0,
+        "rating_total": 0,
+    }
+
+
+def _finish_rollup(rollup: Dict[str, Any]) -> Dict[str, Any]:
+    books = rollup["books"]
+    ratings = rollup["ratings"]
+    return {
+        "books": books,
+        "pages": rollup["pages"],
+        "fiction": rollup["fiction"],
+        "fiction_ratio": rollup["fiction"] / books if books else None,
+        "abandoned": rollup["abandoned"],
+        "average_rating": float(rollup["rating_total"]) / ratings if ratings else None,
+        "value": round(rollup["value"], 2),
+    }
+
+
+def _get_book_tables_fingerprint(db: Database) -> Tuple[Any, ...]:
+    row = db.sql(
+        """
+        SELECT
+          (SELECT COUNT(*) FROM books),
+          (SELECT MAX(last_updated_at) FROM books),
+          (SELECT COUNT(*) FROM book_entries),
+          (SELECT MAX(last_updated_at) FROM book_entries)
+        """,
+        as_tuple=True,
+    )[0]
+    return tuple(row)
 
 
 AVERAGE_PAGES = 300
@@ -128,32 +276,59 @@ def get_percentage_in_interval(
     return n / ((entry["date_ended"] - entry["date_started"]).days + 1)
 
 
-def _convert_entry(
-    db: Database, entry: Row, year: Optional[int] = None, month: Optional[int] = None
+def _get_entry(
+    db: Database, pk: int, year: Optional[int] = None, month: Optional[int] = None
 ) -> Row:
-    book = db.get_by_pk("books", entry["book"])
-    converted_entry = {
-        "book_id": book["id"],
-        "entry_id": entry["id"],
-        "title": book["title"],
-        "authors": book["authors"],
-        "date_started": entry["date_started"],
-        "date_ended": entry["date_ended"],
-        "abandoned": entry["abandoned"],
-        "skimmed": entry["skimmed"],
-        "fiction": book["fictional"],
-        "pages": book["pages"],
-        "rating": entry["rating"],
-        "kg_link": book["kg_link"],
-    }
-    _set_value(converted_entry, year, month)
-    return converted_entry
+    return _select_entries(db, "book_entries.id = :pk", {"pk": pk}, year, month)[0]
+
+
+def _select_entries(
+    db: Database,
+    where: str,
+    values: dict,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+) -> List[Row]:
+    # The entry and book columns are fetched together, so the number of queries does not
+    # depend on the number of entries. The unary plus stops SQLite from walking the
+    # table in id order to avoid a sort, which would bypass `book_entries_interval`.
+    entries = db.sql(
+        f"""
+        SELECT
+          books.id AS book_id,
+          book_entries.id AS entry_id,
+          books.title,
+          books.authors,
+          book_entries.date_started,
+          book_entries.date_ended,
+          book_entries.abandoned,
+          book_entries.skimmed,
+          books.fictional AS fiction,
+          books.pages,
+          book_entries.rating,
+          books.kg_link
+        FROM
+          book_entries
+        JOIN
+          books
+        ON
+          books.id = book_entries.book
+        WHERE
+          {where}
+        ORDER BY
+          +book_entries.id
+        """,
+        values=values,
+    )
+    for entry in entries:
+        _set_value(entry, year, month)
+    return entries
 
 
 def _set_value(
     entry: Row, year: Optional[int] = None, month: Optional[int] = None
 ) -> None:
-    entry["value"] = _get_value(entry)
+    entry["value"] = get_value(entry)
     if year is not None:
         entry["percentage_in_interval"] = get_percentage_in_interval(entry, year, month)
         entry["value_in_interval"] = entry["value"] * entry["percentage_in_interval"]
@@ -162,7 +337,7 @@ def _set_value(
         entry["value_in_interval"] = None
 
 
-def _get_value(entry: Row) -> float:
+def get_value(entry: Row) -> float:
     v = entry["pages"] / AVERAGE_PAGES if entry["pages"] else 1
     if entry["skimmed"]:
         v *= 0.5
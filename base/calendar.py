@@ -1,8 +1,24 @@
 import datetime
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
 
+from base import schema
 from base.database import Database, Row
-from base.utils import date_range
+from base.utils import get_days_in_month, make_in_condition, month_range
+
+# Recurring events are expanded into the `calendar_occurrences` table for this many
+# months before and after the current month by `refresh_occurrence_cache`.
+OCCURRENCE_CACHE_MONTHS_BEFORE = 1
+OCCURRENCE_CACHE_MONTHS_AFTER = 12
+
+# The triggers in `schema.TRIGGERS` that invalidate the occurrence cache. The cache is
+# neither read nor written unless they all exist.
+OCCURRENCE_CACHE_TRIGGERS = [
+    "calendar_recurring_events_update",
+    "calendar_recurring_events_delete",
+    "calendar_recurring_event_exceptions_insert",
+    "calendar_recurring_event_exceptions_update",
+    "calendar_recurring_event_exceptions_delete",
+]
 
 
 def list_calendar_events(
@@ -33,78 +49,309 @@ def list_calendar_events(
 def get_recurring_events(
     db: Database, start: datetime.date, end: datetime.date
 ) -> List[Row]:
+    """
+    Returns the occurrences of recurring events from ``start`` to ``end``.
+
+    Occurrences are read from the cache written by ``refresh_occurrence_cache`` for
+    recurring events that are cached for every month of the range, and expanded from
+    the recurrence rule for the rest.
+    """
+    months = list(month_range(start, end))
+    recurring_events = db.sql(
+        """
+        SELECT
+          calendar_recurring_events.*,
+          (
+            SELECT
+              COUNT(*)
+            FROM
+              calendar_occurrence_months
+            WHERE
+              calendar_occurrence_months.recurring_event = calendar_recurring_events.id
+              AND calendar_occurrence_months.month BETWEEN :first_month AND :last_month
+          ) AS cached_months
+        FROM
+          calendar_recurring_events
+        WHERE
+          (recurrence_start <= :end)
+          AND (recurrence_end IS NULL OR recurrence_end >= :start)
+        """,
+        values={
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "first_month": months[0].isoformat() if months else None,
+            "last_month": months[-1].isoformat() if months else None,
+        },
+    )
+
+    # Without the triggers, changes made since the cache was written may be missing
+    # from it.
+    use_cache = not schema.get_missing_triggers(db, OCCURRENCE_CACHE_TRIGGERS)
+
+    cached_events = {}
+    uncached_events = []
+    for recurring_event in recurring_events:
+        if recurring_event.pop("cached_months") == len(months) and use_cache:
+            cached_events[recurring_event["id"]] = recurring_event
+        else:
+            uncached_events.append(recurring_event)
+
     events = []
+    if cached_events:
+        occurrences = db.select(
+            "calendar_occurrences",
+            where=":start <= date AND date <= :end",
+            values={"start": start.isoformat(), "end": end.isoformat()},
+            order_by="date",
+        )
+        for occurrence in occurrences:
+            recurring_event = cached_events.get(occurrence["recurring_event"])
+            if recurring_event is None:
+                continue
+
+            events.append(
+                _make_event(
+                    recurring_event,
+                    occurrence["date"],
+                    occurrence if occurrence["modified"] else None,
+                )
+            )
+
+    exceptions = _get_recurrence_exceptions(db, uncached_events, start, end)
+    for recurring_event in uncached_events:
+        events.extend(
+            _get_concrete_events_from_recurrence(
+                recurring_event, exceptions.get(recurring_event["id"], {}), start, end
+            )
+        )
+
+    return events
+
+
+def refresh_occurrence_cache(db: Database, today: datetime.date) -> int:
+    """
+    Expands recurring events into the `calendar_occurrences` table for every month in
+    the rolling horizon around ``today`` that is not already cached, and drops cached
+    months that have fallen out of the horizon. Returns the number of months of
+    recurring events that were expanded.
+
+    Cached months are invalidated by the triggers in ``OCCURRENCE_CACHE_TRIGGERS`` when
+    a recurring event or one of its exceptions is changed. If any of the triggers is
+    missing, e.g. because a migration dropped it, it is created and the whole cache is
+    dropped, since changes made without it were not seen.
+    """
+    if schema.ensure_triggers(db, OCCURRENCE_CACHE_TRIGGERS):
+        db.delete("calendar_occurrence_months", where="1")
+        db.delete("calendar_occurrences", where="1")
+
+    first_month = _add_months(today.replace(day=1), -OCCURRENCE_CACHE_MONTHS_BEFORE)
+    last_month = _add_months(today.replace(day=1), OCCURRENCE_CACHE_MONTHS_AFTER)
+    last_day = last_month.replace(
+        day=get_days_in_month(last_month.year, last_month.month)
+    )
+    values = {"first_month": first_month.isoformat(), "last_day": last_day.isoformat()}
+
+    db.delete(
+        "calendar_occurrence_months",
+        where="month < :first_month OR month > :last_day",
+        values=values,
+    )
+    db.delete(
+        "calendar_occurrences",
+        where="date < :first_month OR date > :last_day",
+        values=values,
+    )
 
     recurring_events = db.select(
         "calendar_recurring_events",
         where="""
-            (recurrence_start <= :end)
-            AND (recurrence_end IS NULL OR recurrence_end < :start)
+            (recurrence_start <= :last_day)
+            AND (recurrence_end IS NULL OR recurrence_end >= :first_month)
         """,
-        values={"start": start.isoformat(), "end": end.isoformat()},
+        values=values,
     )
-    for recurring_event in recurring_events:
-        events.extend(
-            _get_concrete_events_from_recurrence(db, recurring_event, start, end)
+    cached_months = set(
+        db.sql(
+            "SELECT recurring_event, month FROM calendar_occurrence_months",
+            as_tuple=True,
         )
+    )
+    exceptions = _get_recurrence_exceptions(db, recurring_events, first_month, last_day)
 
-    return events
+    month_rows = []
+    occurrence_rows = []
+    for recurring_event in recurring_events:
+        pk = recurring_event["id"]
+        for month in month_range(first_month, last_month):
+            if (pk, month) in cached_months:
+                continue
 
+            end_of_month = month.replace(day=get_days_in_month(month.year, month.month))
+            month_exceptions = {
+                date: exception
+                for date, exception in exceptions.get(pk, {}).items()
+                if month <= date <= end_of_month
+            }
+            for date, exception in _expand_recurrence(
+                recurring_event, month_exceptions, month, end_of_month
+            ):
+                occurrence = exception if exception is not None else recurring_event
+                occurrence_rows.append(
+                    {
+                        "recurring_event": pk,
+                        "date": date,
+                        "start": occurrence["start"],
+                        "end": occurrence["end"],
+                        "modified": exception is not None,
+                    }
+                )
+            month_rows.append({"recurring_event": pk, "month": month})
 
-def _get_concrete_events_from_recurrence(
-    db: Database, recurring_event: Row, start: datetime.date, end: datetime.date
-) -> List[Row]:
-    recurrence_exception_list = db.select(
+    db.insert_many("calendar_occurrence_months", month_rows)
+    db.insert_many("calendar_occurrences", occurrence_rows)
+    return len(month_rows)
+
+
+def _add_months(month: datetime.date, n: int) -> datetime.date:
+    year, index = divmod(month.year * 12 + (month.month - 1) + n, 12)
+    return datetime.date(year, index + 1, 1)
+
+
+def _get_recurrence_exceptions(
+    db: Database, recurring_events: List[Row], start: datetime.date, end: datetime.date
+) -> Dict[int, Dict[datetime.date, Row]]:
+    """
+    Returns the exceptions between ``start`` and ``end`` for all the recurring events
+    with a single query, as a map from recurring event ID to a map from date to
+    exception row.
+    """
+    if not recurring_events:
+        return {}
+
+    values = {"start": start.isoformat(), "end": end.isoformat()}
+    in_condition = make_in_condition(
+        "recurring_event",
+        [recurring_event["id"] for recurring_event in recurring_events],
+        values,
+    )
+    rows = db.select(
         "calendar_recurring_event_exceptions",
-        where="recurring_event = :recurring_event AND :start <= date AND date <= :end",
-        values={
-            "recurring_event": recurring_event["id"],
-            "start": start.isoformat(),
-            "end": end.isoformat(),
-        },
+        where=f"""
+            {in_condition}
+            AND date BETWEEN :start AND :end
+        """,
+        values=values,
     )
-    recurrence_exception_map = {
-        exception["date"].isoformat(): exception
-        for exception in recurrence_exception_list
-    }
 
-    events = []
-    for date in date_range(start, end):
-        # Check if the recurring event has an exception row.
-        if date.isoformat() in recurrence_exception_map:
-            exception = recurrence_exception_map[date.isoformat()]
-            # Missing `start` and `end` columns in an exception row indicate that the
-            # event was cancelled.
-            if not exception["start"] or not exception["end"]:
-                continue
+    exceptions: Dict[int, Dict[datetime.date, Row]] = {}
+    for row in rows:
+        exceptions.setdefault(row["recurring_event"], {})[row["date"]] = row
+    return exceptions
+
 
-            # Otherwise, the start or end of the event was modified.
-            modified_event = recurring_event.copy()
-            modified_event["start"] = exception["start"]
-            modified_event["end"] = exception["end"]
-            modified_event["start_date"] = exception["date"]
-            modified_event["end_date"] = exception["date"]
-            events.append(modified_event)
+def _get_concrete_events_from_recurrence(
+    recurring_event: Row,
+    recurrence_exception_map: Dict[datetime.date, Row],
+    start: datetime.date,
+    end: datetime.date,
+) -> List[Row]:
+    return [
+        _make_event(recurring_event, date, exception)
+        for date, exception in _expand_recurrence(
+            recurring_event, recurrence_exception_map, start, end
+        )
+    ]
+
+
+def _expand_recurrence(
+    recurring_event: Row,
+    recurrence_exception_map: Dict[datetime.date, Row],
+    start: datetime.date,
+    end: datetime.date,
+) -> List[Tuple[datetime.date, Optional[Row]]]:
+    """
+    Returns the dates of the recurring event from ``start`` to ``end`` in order, each
+    paired with the exception row that modifies it, or None if it is not modified.
+    Cancelled occurrences are omitted.
+    """
+    occurrences: List[Tuple[datetime.date, Optional[Row]]] = [
+        (date, None)
+        for date in get_occurrences(recurring_event, start, end)
+        if date not in recurrence_exception_map
+    ]
+
+    for date, exception in recurrence_exception_map.items():
+        # Missing `start` and `end` columns in an exception row indicate that the
+        # event was cancelled.
+        if not exception["start"] or not exception["end"]:
             continue
 
-        recurrence_start = recurring_event["recurrence_start"]
-        converted_event = _convert_recurring_event(date, recurring_event)
-        if recurring_event["recurrence"] == "weekdays":
-            if date.weekday() < 5:
-                events.append(converted_event)
-        elif recurring_event["recurrence"] == "weekly":
-            if date.weekday() == recurrence_start.weekday():
-                events.append(converted_event)
-        elif recurring_event["recurrence"] == "yearly":
-            if (
-                date.month == recurrence_start.month
-                and date.day == recurrence_start.day
-            ):
-                events.append(converted_event)
-        else:
-            raise ValueError(recurring_event["recurrence"])
+        # Otherwise, the start or end of the event was modified.
+        occurrences.append((date, exception))
 
-    return events
+    occurrences.sort(key=lambda occurrence: occurrence[0])
+    return occurrences
+
+
+def get_occurrences(
+    recurring_event: Row, start: datetime.date, end: datetime.date
+) -> Iterator[datetime.date]:
+    """
+    Yields the dates on which the recurring event occurs, from ``start`` to ``end``
+    inclusive, without regard to exceptions.
+
+    The dates are computed directly from the recurrence rule, so the cost is
+    proportional to the number of occurrences rather than to the length of the range.
+    """
+    recurrence = recurring_event["recurrence"]
+    recurrence_start = recurring_event["recurrence_start"]
+    recurrence_end = recurring_event["recurrence_end"]
+
+    first = max(start, recurrence_start)
+    last = min(end, recurrence_end) if recurrence_end is not None else end
+
+    if recurrence == "weekdays":
+        date = first
+        # Skip ahead to Monday if the range starts on a weekend.
+        if date.weekday() >= 5:
+            date += datetime.timedelta(days=7 - date.weekday())
+        while date <= last:
+            yield date
+            # Skip from Friday to Monday.
+            date += datetime.timedelta(days=3 if date.weekday() == 4 else 1)
+    elif recurrence == "weekly":
+        date = first + datetime.timedelta(
+            days=(recurrence_start.weekday() - first.weekday()) % 7
+        )
+        while date <= last:
+            yield date
+            date += datetime.timedelta(days=7)
+    elif recurrence == "yearly":
+        for year in range(first.year, last.year + 1):
+            try:
+                date = recurrence_start.replace(year=year)
+            except ValueError:
+                # February 29 only occurs in leap years.
+                continue
+
+            if first <= date <= last:
+                yield date
+    else:
+        raise ValueError(recurrence)
+
+
+def _make_event(
+    recurring_event: Row, date: datetime.date, exception: Optional[Row]
+) -> Row:
+    if exception is None:
+        return _convert_recurring_event(date, recurring_event)
+
+    modified_event = recurring_event.copy()
+    modified_event["start"] = exception["start"]
+    modified_event["end"] = exception["end"]
+    modified_event["start_date"] = date
+    modified_event["end_date"] = date
+    return modified_event
 
 
 def _convert_recurring_event(date: datetime.date, recurring_event: Row) -> Row:
@@ -22,3 +22,11 @@ EDITOR = "vim"
 
 # The preferred browser program.
 BROWSER = "google-chrome"
+
+# Whether to select the next drill quiz in the background after a quiz is submitted,
+# so that the drill page loads immediately.
+DRILL_PREFETCH = True
+
+# Whether drill answers are compared ignoring accents and punctuation as well as case,
+# e.g. so that "Sao Paulo" matches "São Paulo".
+DRILL_LENIENT_ANSWERS = False
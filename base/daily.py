@@ -2,8 +2,12 @@
 The implementation of the daily script invoked by `kgx daily`.
 """
 import datetime
+from typing import List
 
+from base import calendar as calendar_service
 from base import goals as goals_service
+from base import metrics as metrics_service
+from base import tasks as tasks_service
 from base.database import Database, Row
 from base.utils import KgDate
 
@@ -31,6 +35,20 @@ def daily_task(db: Database, date: datetime.date) -> None:
 
     create_recurring_expenses(db, date)
 
+    # Precompute metrics up to the end of the previous month so that they can be served
+    # from the cache.
+    metrics_service.refresh_metric_cache(
+        db, date.replace(day=1) - datetime.timedelta(days=1)
+    )
+
+    # Expand recurring calendar events for the months around today so that the
+    # calendar can be served from the cache.
+    calendar_service.refresh_occurrence_cache(db, date)
+
+    # Make sure that the triggers that track when tasks were last active exist, in case
+    # `kgx indexes` has not been run since they were added.
+    tasks_service.backfill_last_updated_at_overall(db)
+
 
 def create_recurring_expenses(db: Database, date: datetime.date) -> None:
     # Create any recurring expenses, e.g.
@@ -77,10 +95,7 @@ def freeze_auto_progress_goals(db: Database, date: datetime.date) -> None:
         where="timespan = 'month' AND date = :date",
         values={"date": start_of_month.isoformat()},
     )
-    for goal in monthly_goals:
-        auto_progress = goals_service.get_auto_progress(db, last_day_of_timespan, goal)
-        if auto_progress is not None:
-            db.update_by_pk("goals", goal["id"], {"progress": auto_progress})
+    _freeze_goals(db, last_day_of_timespan, monthly_goals)
 
     if ((date.month - 1) % 3) == 0:
         start_of_quarter = kg_date.minus(months=3)
@@ -90,12 +105,7 @@ def freeze_auto_progress_goals(db: Database, date: datetime.date) -> None:
             where="timespan = 'quarter' AND date = :date",
             values={"date": start_of_quarter.isoformat()},
         )
-        for goal in quarterly_goals:
-            auto_progress = goals_service.get_auto_progress(
-                db, last_day_of_timespan, goal
-            )
-            if auto_progress is not None:
-                db.update_by_pk("goals", goal["id"], {"progress": auto_progress})
+        _freeze_goals(db, last_day_of_timespan, quarterly_goals)
 
     if date.month == 1:
         start_of_year = kg_date.minus(years=1)
@@ -105,9 +115,16 @@ def freeze_auto_progress_goals(db: Database, date: datetime.date) -> None:
             where="timespan = 'year' AND date = :date",
             values={"date": start_of_year.isoformat()},
         )
-        for goal in yearly_goals:
-            auto_progress = goals_service.get_auto_progress(
-                db, last_day_of_timespan, goal
-            )
-            if auto_progress is not None:
-                db.update_by_pk("goals", goal["id"], {"progress": auto_progress})
+        _freeze_goals(db, last_day_of_timespan, yearly_goals)
+
+
+def _freeze_goals(
+    db: Database, last_day_of_timespan: datetime.date, goals: List[Row]
+) -> None:
+    auto_progress_map = goals_service.get_auto_progress_for_goals(
+        db, last_day_of_timespan, goals
+    )
+    for goal in goals:
+        auto_progress = auto_progress_map[goal["id"]]
+        if auto_progress is not None:
+            db.update_by_pk("goals", goal["id"], {"progress": auto_progress})
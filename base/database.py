@@ -2,16 +2,26 @@
 A thin wrapper around the ``isqlite.Database`` API to automatically use some Khaganate-
 specific settings.
 """
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Optional
 
 from base import constants
 from isqlite import Database as ISqliteDatabase
 
 
 class Database(ISqliteDatabase):
-    def __init__(self, *args, **kwargs) -> None:
+    path: str
+    _on_commit_callbacks: List[Callable[[], None]]
+
+    def __init__(self, *args, path: Optional[str] = None, **kwargs) -> None:
+        """
+        :param path: The path to the database file. Defaults to
+            ``constants.DATABASE_PATH``; other paths are used for scratch databases,
+            e.g. by ``base.drill_simulation``.
+        """
+        self.path = path if path is not None else constants.DATABASE_PATH
+        self._on_commit_callbacks = []
         return super().__init__(
-            constants.DATABASE_PATH,
+            self.path,
             *args,
             # The database schema uses `AutoTable` which automatically creates
             # `created_at` and `last_updated_at` columns, so we tell the database to
@@ -22,5 +32,21 @@ class Database(ISqliteDatabase):
             **kwargs
         )
 
+    def on_commit(self, callback: Callable[[], None]) -> None:
+        """
+        Registers a function to be called after the ``with`` block of the database
+        exits successfully, i.e. once its transaction has been committed and the
+        connection closed.
+
+        Useful for starting work that must see the changes made in the transaction.
+        """
+        self._on_commit_callbacks.append(callback)
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        super().__exit__(exc_type, exc_value, exc_traceback)
+        if exc_type is None:
+            for callback in self._on_commit_callbacks:
+                callback()
+
 
 Row = Dict[str, Any]
@@ -1,23 +1,47 @@
+import functools
+import heapq
 import json
 import math
 import random
 import re
+import threading
 import time
-from typing import Any, Dict, List
-
+import unicodedata
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from base import constants
 from base.database import Database, Row
+from base.schema import QUESTION_TYPES
+from base.utils import make_in_condition
 
 Question = Dict[str, Any]
 Quiz = List[Question]
+# One set of acceptable normalized answers per slot: a single slot for short-answer and
+# multiple-choice questions, and one slot per item for list questions.
+AnswerMatcher = Tuple[FrozenSet[str], ...]
 
 
 def get_quiz(db: Database) -> Quiz:
     """
     Selects a list of 20 questions from the database.
 
-    A thin wrapper around `select_questions` intended for use as a JSON API.
+    A thin wrapper around `select_questions` intended for use as a JSON API. If a quiz
+    was prefetched after the last submission and is still fresh, it is returned
+    instead.
     """
-    questions = select_questions(db)
+    questions = take_prefetched_quiz(db) if constants.DRILL_PREFETCH else None
+    if questions is None:
+        questions = select_questions(db)
 
     # Convert question fields to JSON.
     for question in questions:
@@ -25,15 +49,33 @@ def get_quiz(db: Database) -> Quiz:
         if question["choices"]:
             question["choices"] = json.loads(question["choices"])
 
+        # Compile the answer now so that it is cached by the time the quiz is scored.
+        compile_answer(question)
+
     return questions
 
 
-def submit_quiz(db: Database, responses: Dict[str, Any]) -> dict:
+def submit_quiz(
+    db: Database,
+    responses: Dict[str, Any],
+    *,
+    now: Optional[int] = None,
+    prefetch: bool = True,
+) -> dict:
     """
     Submits a quiz to be scored.
+
+    :param now: The time of submission as a Unix timestamp. Defaults to the current
+        time; the simulation in ``base.drill_simulation`` passes simulated times.
+    :param prefetch: If false, the next quiz is not prefetched even if
+        ``constants.DRILL_PREFETCH`` is set.
     """
-    t = int(time.time())
+    t = int(time.time()) if now is None else now
     results = []
+    result_rows = []
+    question_updates = []
+    question_scores = []
+    quiz_scores = []
     quizzes_taken = set()
     for response in responses["responses"]:
         question = response["question"]
@@ -46,13 +88,12 @@ def submit_quiz(db: Database, responses: Dict[str, Any]) -> dict:
 
         score = score_question(question, answer)
 
-        db.insert_and_get(
-            "quiz_results",
+        result_rows.append(
             {
                 "question": question["id"],
                 "score": score,
                 "time_asked": t,
-            },
+            }
         )
         results.append(
             {
@@ -62,7 +103,7 @@ def submit_quiz(db: Database, responses: Dict[str, Any]) -> dict:
         )
 
         strength = question["strength"]
-        if score >= 80:
+        if score >= CORRECT_SCORE:
             # Strength is capped at 5 unless the user explicitly marks it as memorized,
             # which is handled outside this function.
             if strength < 4:
@@ -70,24 +111,324 @@ def submit_quiz(db: Database, responses: Dict[str, Any]) -> dict:
         elif score <= 50:
             if strength == 10:
                 strength = 2
-            else:
+            elif strength > 0:
                 strength -= 1
 
-        db.update_by_pk(
-            "quiz_questions",
-            question["id"],
-            {
-                "strength": strength,
-                "time_last_asked": t,
-            },
+        question_updates.append((strength, t, question["id"]))
+        question_scores.append((question["id"], score))
+        quiz_scores.append((question["quiz"]["id"], score))
+
+    db.insert_many("quiz_results", result_rows)
+    # isqlite has no batched update, so the statement is executed directly. It sets
+    # `last_updated_at` itself since it bypasses `Database.update`.
+    db.cursor.executemany(
+        """
+        UPDATE
+          quiz_questions
+        SET
+          strength = ?,
+          time_last_asked = ?,
+          last_updated_at = STRFTIME('%s', 'now')
+        WHERE
+          id = ?
+        """,
+        question_updates,
+    )
+
+    if quizzes_taken:
+        values: Dict[str, Any] = {}
+        db.update(
+            "quizzes",
+            {"time_last_taken": t},
+            where=make_in_condition("id", quizzes_taken, values),
+            values=values,
         )
 
-    for quiz_pk in quizzes_taken:
-        db.update_by_pk("quizzes", quiz_pk, {"time_last_taken": t})
+    _update_stats(db, "quiz_question_stats", "question", question_scores)
+    _update_stats(db, "quiz_stats", "quiz", quiz_scores)
+
+    if prefetch and constants.DRILL_PREFETCH:
+        db.on_commit(lambda: start_prefetch(db.path))
 
     return {"results": results}
 
 
+# Scores at or above this are counted as correct, both for increasing a question's
+# strength and for streaks.
+CORRECT_SCORE = 80
+
+# The number of scores kept in the `recent_scores` column of the statistics tables.
+RECENT_SCORES_COUNT = 10
+
+# The columns of the `quiz_question_stats` and `quiz_stats` tables, besides the
+# foreign key.
+STATS_COLUMNS = (
+    "attempts",
+    "total_score",
+    "recent_scores",
+    "current_streak",
+    "longest_streak",
+)
+
+
+def get_stats(db: Database) -> List[Row]:
+    """
+    Returns the aggregate statistics of every quiz, including quizzes that have never
+    been taken.
+    """
+    rows = db.sql(
+        """
+        SELECT
+          quizzes.id,
+          quizzes.name,
+          quizzes.disabled,
+          quiz_stats.attempts,
+          quiz_stats.total_score,
+          quiz_stats.recent_scores,
+          quiz_stats.current_streak,
+          quiz_stats.longest_streak
+        FROM
+          quizzes
+        LEFT JOIN
+          quiz_stats
+        ON
+          quiz_stats.quiz = quizzes.id
+        ORDER BY
+          quizzes.name
+        """
+    )
+    return [{**row, **_convert_stats(row)} for row in rows]
+
+
+def get_quiz_stats(db: Database, quiz_pk: int) -> Row:
+    """
+    Returns the aggregate statistics of a quiz and of each of its questions.
+    """
+    quiz = db.get_by_pk("quizzes", quiz_pk)
+    if quiz is None:
+        raise ValueError(f"quiz {quiz_pk} does not exist")
+
+    quiz_stats = db.get("quiz_stats", where="quiz = :quiz", values={"quiz": quiz_pk})
+    questions = db.sql(
+        """
+        SELECT
+          quiz_questions.id,
+          quiz_questions.text,
+          quiz_questions.strength,
+          quiz_questions.deprecated,
+          quiz_question_stats.attempts,
+          quiz_question_stats.total_score,
+          quiz_question_stats.recent_scores,
+          quiz_question_stats.current_streak,
+          quiz_question_stats.longest_streak
+        FROM
+          quiz_questions
+        LEFT JOIN
+          quiz_question_stats
+        ON
+          quiz_question_stats.question = quiz_questions.id
+        WHERE
+          quiz_questions.quiz = :quiz
+        ORDER BY
+          quiz_questions.id
+        """,
+        values={"quiz": quiz_pk},
+    )
+
+    quiz.update(_convert_stats(quiz_stats or {}))
+    quiz["questions"] = [
+        {**question, **_convert_stats(question)} for question in questions
+    ]
+    return quiz
+
+
+def rebuild_stats(db: Database) -> None:
+    """
+    Recomputes the statistics tables from scratch from the `quiz_results` table.
+
+    ``submit_quiz`` keeps the statistics up to date, so this is only needed to fill in
+    the tables with results from before they existed.
+    """
+    db.delete("quiz_question_stats", where="1")
+    db.delete("quiz_stats", where="1")
+
+    results = db.sql(
+        """
+        SELECT
+          quiz_results.question,
+          quiz_questions.quiz,
+          quiz_results.score
+        FROM
+          quiz_results
+        JOIN
+          quiz_questions
+        ON
+          quiz_questions.id = quiz_results.question
+        ORDER BY
+          quiz_results.id
+        """,
+        as_tuple=True,
+    )
+    _update_stats(
+        db, "quiz_question_stats", "question", [(r[0], r[2]) for r in results]
+    )
+    _update_stats(db, "quiz_stats", "quiz", [(r[1], r[2]) for r in results])
+
+
+def _update_stats(
+    db: Database, table: str, column: str, scores: List[Tuple[int, int]]
+) -> None:
+    """
+    Folds a list of ``(pk, score)`` pairs, in the order that they were answered, into
+    the statistics table, where ``pk`` is the value of ``column``.
+    """
+    if not scores:
+        return
+
+    values: Dict[str, Any] = {}
+    where = make_in_condition(column, {pk for pk, _ in scores}, values)
+    existing_rows = db.select(table, where=where, values=values)
+    existing = {row[column]: row for row in existing_rows}
+
+    stats_map: Dict[int, Row] = {}
+    for pk, score in scores:
+        stats = stats_map.get(pk)
+        if stats is None:
+            row = existing.get(pk)
+            stats = stats_map[pk] = {
+                "attempts": row["attempts"] if row else 0,
+                "total_score": row["total_score"] if row else 0,
+                "recent_scores": json.loads(row["recent_scores"]) if row else [],
+                "current_streak": row["current_streak"] if row else 0,
+                "longest_streak": row["longest_streak"] if row else 0,
+            }
+
+        stats["attempts"] += 1
+        stats["total_score"] += score
+        stats["recent_scores"] = (stats["recent_scores"] + [score])[
+            -RECENT_SCORES_COUNT:
+        ]
+        if score >= CORRECT_SCORE:
+            stats["current_streak"] += 1
+            stats["longest_streak"] = max(
+                stats["longest_streak"], stats["current_streak"]
+            )
+        else:
+            stats["current_streak"] = 0
+
+    inserts = []
+    updates = []
+    for pk, stats in stats_map.items():
+        stats["recent_scores"] = json.dumps(stats["recent_scores"])
+        if pk in existing:
+            updates.append(tuple(stats[c] for c in STATS_COLUMNS) + (pk,))
+        else:
+            inserts.append({column: pk, **stats})
+
+    db.insert_many(table, inserts)
+    # See the note in `submit_quiz` on why this is executed directly.
+    db.cursor.executemany(
+        f"""
+        UPDATE
+          {table}
+        SET
+          attempts = ?,
+          total_score = ?,
+          recent_scores = ?,
+          current_streak = ?,
+          longest_streak = ?,
+          last_updated_at = STRFTIME('%s', 'now')
+        WHERE
+          {column} = ?
+        """,
+        updates,
+    )
+
+
+def _convert_stats(row: Row) -> Row:
+    """
+    Returns the statistics columns of the row in the form served by the API. The row
+    may come from a LEFT JOIN, in which case the columns are null.
+    """
+    attempts = row.get("attempts") or 0
+    total_score = row.get("total_score") or 0
+    return {
+        "attempts": attempts,
+        "total_score": total_score,
+        "mean_score": total_score / attempts if attempts else None,
+        "recent_scores": json.loads(row.get("recent_scores") or "[]"),
+        "current_streak": row.get("current_streak") or 0,
+        "longest_streak": row.get("longest_streak") or 0,
+    }
+
+
+# The next quiz, selected in the background after a quiz is submitted, along with the
+# path of the database and the fingerprint of the quiz tables at the time it was
+# selected.
+_prefetched_quiz: Optional[Tuple[str, Tuple[Any, ...], List[Row]]] = None
+_prefetched_quiz_lock = threading.Lock()
+
+
+def start_prefetch(path: str) -> None:
+    """
+    Selects the next quiz from the database at ``path`` in a background thread and
+    stores it for ``get_quiz``.
+
+    This must be called after the submitted quiz has been committed, or else the
+    prefetched quiz will be stale.
+    """
+    thread = threading.Thread(target=_prefetch, args=(path,), daemon=True)
+    thread.start()
+
+
+def _prefetch(path: str) -> None:
+    global _prefetched_quiz
+
+    with Database(path=path, readonly=True) as db:
+        fingerprint = _get_quiz_tables_fingerprint(db)
+        questions = select_questions(db)
+
+    with _prefetched_quiz_lock:
+        _prefetched_quiz = (path, fingerprint, questions)
+
+
+def take_prefetched_quiz(db: Database) -> Optional[List[Row]]:
+    """
+    Returns the prefetched quiz and clears it, or returns None if there is no
+    prefetched quiz or if the questions or quizzes have changed since it was selected.
+    """
+    global _prefetched_quiz
+
+    with _prefetched_quiz_lock:
+        prefetched_quiz = _prefetched_quiz
+        _prefetched_quiz = None
+
+    if prefetched_quiz is None:
+        return None
+
+    path, fingerprint, questions = prefetched_quiz
+    if path != db.path or fingerprint != _get_quiz_tables_fingerprint(db):
+        return None
+
+    return questions
+
+
+def _get_quiz_tables_fingerprint(db: Database) -> Tuple[Any, ...]:
+    # Any write through isqlite updates `last_updated_at`, and the counts catch
+    # deletions.
+    return db.sql(
+        """
+        SELECT
+          (SELECT MAX(last_updated_at) FROM quiz_questions),
+          (SELECT COUNT(*) FROM quiz_questions),
+          (SELECT MAX(last_updated_at) FROM quizzes),
+          (SELECT COUNT(*) FROM quizzes)
+        """,
+        as_tuple=True,
+        multiple=False,
+    )
+
+
 def select_questions(db: Database) -> List[Row]:
     """
     Selects a list of 20 questions from the database using a spaced-repetition
@@ -113,29 +454,65 @@ def select_quizzes(db: Database) -> List[Row]:
     """
     Selects a list of 3 questions from the database using a spaced-repetition algorithm.
     """
-    quizzes = db.select("quizzes", where="disabled = 0")
-    weights = get_quiz_weights(db, quizzes)
+    quizzes = db.sql(
+        """
+        SELECT
+          quizzes.*,
+          AVG(quiz_questions.strength) AS average_strength
+        FROM
+          quizzes
+        LEFT JOIN
+          quiz_questions
+        ON
+          quiz_questions.quiz = quizzes.id
+        WHERE
+          quizzes.disabled = 0
+        GROUP BY
+          quizzes.id
+        """
+    )
+    weights = get_quiz_weights(quizzes)
     return make_weighted_choice(quizzes, weights, 3)
 
 
 def select_questions_from_quizzes(db: Database, quiz: Row, count: int) -> List[Row]:
-    pool = db.select(
-        "quiz_questions",
-        where="quiz = :quiz AND deprecated = 0",
+    # Only the columns needed to weight the questions are fetched for the whole pool.
+    # The full rows are fetched afterwards for the selected questions alone.
+    pool = db.sql(
+        """
+        SELECT
+          id, time_last_asked, strength
+        FROM
+          quiz_questions
+        WHERE
+          quiz = :quiz AND deprecated = 0
+        """,
         values={"quiz": quiz["id"]},
+        as_tuple=True,
+    )
+    pks, times_last_asked, strengths = zip(*pool)
+    weights = get_question_weights(times_last_asked, strengths)
+    selected_pks = make_weighted_choice(pks, weights, count)
+
+    values: Dict[str, Any] = {}
+    selected = db.select(
+        "quiz_questions",
+        where=make_in_condition("quiz_questions.id", selected_pks, values),
+        values=values,
         get_related=["quiz"],
     )
-    weights = get_question_weights(db, pool)
-    selected = make_weighted_choice(pool, weights, count)
     random.shuffle(selected)
     return selected
 
 
-def get_quiz_weights(db: Database, quizzes: List[Row]) -> List[float]:
+def get_quiz_weights(quizzes: List[Row]) -> List[float]:
     """
     Returns the weights for the list of quizzes so that quizzes[i] corresponds to
     weights[i] in the return value.
 
+    Each quiz must have an ``average_strength`` field with the average strength of its
+    questions, as computed by the query in ``select_quizzes``.
+
     Weights are between 0.0 and 1.0. Higher values mean the quiz is more likely to be
     selected, but are otherwise arbitrary (1.0 does not mean the quiz has a 100% chance
     of being selected).
@@ -145,22 +522,7 @@ def get_quiz_weights(db: Database, quizzes: List[Row]) -> List[float]:
 
     weights = []
     for quiz in quizzes:
-        average_strength = (
-            db.sql(
-                """
-            SELECT
-              AVG(strength)
-            FROM
-              quiz_questions
-            WHERE
-              quiz = :quiz
-            """,
-                values={"quiz": quiz["id"]},
-                as_tuple=True,
-                multiple=False,
-            )[0]
-            or 0
-        )
+        average_strength = quiz["average_strength"] or 0
 
         if minimum_time_last_taken != maximum_time_last_taken:
             m = 1 / (minimum_time_last_taken - maximum_time_last_taken)
@@ -191,111 +553,325 @@ def get_quiz_weights(db: Database, quizzes: List[Row]) -> List[float]:
     return weights
 
 
-def get_question_weights(db: Database, questions: List[Row]) -> List[float]:
+# Maps each question's strength to a scale of 0 to 1.
+#
+# Strength   Weight
+#        0     1.00
+#        1     0.83
+#        2     0.66
+#        3     0.50
+#        4     0.33
+#        5     0.16
+#       10     0.05
+#
+# Strengths between 5 and 10 are not possible.
+STRENGTH_WEIGHTS = {
+    **{strength: (6 - strength) / 6 for strength in range(6)},
+    10: 0.05,
+}
+
+
+def get_question_weights(
+    times_last_asked: Sequence[int], strengths: Sequence[int]
+) -> List[float]:
     """
-    Returns the weights for the list of questions so that questions[i] corresponds to
-    weights[i] in the return value.
+    Returns the weights for a pool of questions, given the questions' `time_last_asked`
+    and `strength` columns, so that ``times_last_asked[i]`` and ``strengths[i]``
+    correspond to ``weights[i]`` in the return value.
 
     Weights are between 0.0 and 1.0. Higher values mean the question is more likely to
     be selected, but are otherwise arbitrary (1.0 does not mean the quiz has a 100%
     chance of being selected).
     """
-    minimum_time_last_asked = min(question["time_last_asked"] for question in questions)
-    maximum_time_last_asked = max(question["time_last_asked"] for question in questions)
+    minimum_time_last_asked = min(times_last_asked)
+    maximum_time_last_asked = max(times_last_asked)
 
-    weights = []
-    for question in questions:
-        if minimum_time_last_asked != maximum_time_last_asked:
-            m = 1 / (minimum_time_last_asked - maximum_time_last_asked)
-        else:
-            m = 0
-        b = 1
+    if minimum_time_last_asked != maximum_time_last_asked:
+        m = 1 / (minimum_time_last_asked - maximum_time_last_asked)
+    else:
+        m = 0
+    b = 1
+
+    # The time last asked is mapped to a scale of 0 to 1, where 1 means the question
+    # has the minimum value of time last asked (i.e., it has gone the longest without
+    # being asked) and 0 means the question has the maximum value of time last asked.
+    #
+    # Looking up an impossible strength in `STRENGTH_WEIGHTS` raises a `KeyError`.
+    return [
+        0.8 * STRENGTH_WEIGHTS[strength]
+        + 0.2 * (m * (time_last_asked - minimum_time_last_asked) + b)
+        for time_last_asked, strength in zip(times_last_asked, strengths)
+    ]
+
+
+def make_weighted_choice(
+    choices: Sequence, weights: Sequence[float], count: int
+) -> list:
+    """
+    Selects ``count`` items from ``choices`` at random without replacement, such that
+    items with higher weights are more likely to be selected.
+
+    The result has the same distribution (including order) as drawing one item at a
+    time with probability proportional to its weight among the items not yet drawn. It
+    is computed in a single pass using the exponential-key method of Efraimidis and
+    Spirakis: each item is assigned the key ``log(u) / weight`` for a uniformly random
+    ``u``, and the items with the largest keys are selected.
+    """
+    if count > len(choices):
+        raise ValueError(f"cannot choose {count} item(s) from {len(choices)}")
 
-        assert (
-            minimum_time_last_asked
-            <= question["time_last_asked"]
-            <= maximum_time_last_asked
+    keys = (
+        # `1.0 - random.random()` is in the range (0, 1], so the logarithm is defined.
+        (math.log(1.0 - random.random()) / weight if weight > 0 else -math.inf, i)
+        for i, weight in enumerate(weights)
+    )
+    return [choices[i] for _, i in heapq.nlargest(count, keys)]
+
+
+def score_question(
+    question: Question, response: List[Optional[str]], *, lenient: Optional[bool] = None
+) -> int:
+    """
+    Returns the score of the response to the question, as an integer between 0 and 100.
+
+    Answers are compared case-insensitively. If ``lenient`` is true, accents and
+    punctuation are ignored as well. It defaults to ``constants.DRILL_LENIENT_ANSWERS``.
+    """
+    if lenient is None:
+        lenient = constants.DRILL_LENIENT_ANSWERS
+
+    slots = compile_answer(question, lenient=lenient)
+    normalized = [normalize_answer(r or "", lenient=lenient) for r in response]
+    if question["type"] == "unordered-list":
+        responses = frozenset(normalized)
+        points = sum(1 for slot in slots if not slot.isdisjoint(responses))
+        return math.floor((points / len(slots)) * 100)
+    elif question["type"] == "ordered-list":
+        points = sum(1 for r, slot in zip(normalized, slots) if r in slot)
+        return math.floor((points / len(slots)) * 100)
+    else:
+        return 100 if normalized[0] in slots[0] else 0
+
+
+def compile_answer(
+    question: Question, *, lenient: Optional[bool] = None
+) -> AnswerMatcher:
+    """
+    Returns the question's answer compiled to sets of normalized strings that a
+    response can be checked against in constant time.
+
+    The result is cached, so compiling the same answer again is cheap. ``lenient`` is as
+    for ``score_question``.
+    """
+    if lenient is None:
+        lenient = constants.DRILL_LENIENT_ANSWERS
+
+    answer = question["answer"]
+    if question["type"] in ("unordered-list", "ordered-list"):
+        key = tuple(tuple(slot) for slot in answer)
+    else:
+        key = (tuple(answer),)
+
+    return _compile_answer(key, lenient)
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile_answer(slots: Tuple[Tuple[str, ...], ...], lenient: bool) -> AnswerMatcher:
+    return tuple(
+        frozenset(normalize_answer(a, lenient=lenient) for a in slot) for slot in slots
+    )
+
+
+def normalize_answer(answer: str, *, lenient: bool = False) -> str:
+    """
+    Normalizes the answer for comparison by case-folding it and, if ``lenient`` is true,
+    removing accents and punctuation and collapsing whitespace.
+    """
+    answer = answer.casefold()
+    if lenient:
+        answer = "".join(
+            c
+            for c in unicodedata.normalize("NFKD", answer)
+            if (c.isalnum() or c.isspace()) and not unicodedata.combining(c)
         )
+        answer = " ".join(answer.split())
+
+    return answer
 
-        # Map the time last asked to a scale of 0 to 1, where 1 means the question has
-        # the minimum value of time last asked (i.e., it has gone the longest without
-        # being asked) and 0 means the question has the maximum value of time last
-        # asked.
-        time_weight = m * (question["time_last_asked"] - minimum_time_last_asked) + b
-        assert 0.0 <= time_weight <= 1.0
 
-        # Map the question's strength to a scale of 0 to 1.
-        #
-        # Strength   Weight
-        #        1     0.83
-        #        2     0.66
-        #        3     0.50
-        #        4     0.33
-        #        5     0.16
-        #       10     0.05
-        #
-        # Strengths between 5 and 10 are not possible.
-        strength_weight = (
-            0.05 if question["strength"] == 10 else (6 - question["strength"]) / 6
+def import_questions(db: Database, quiz_pk: int, questions: Iterable[Question]) -> int:
+    """
+    Inserts the questions into the quiz, and returns the number of questions inserted.
+
+    ``questions`` is consumed lazily, e.g. from ``parse_questions`` or
+    ``parse_questions_jsonl``, and the rows are written with a single ``executemany``.
+    If parsing fails partway through, the exception propagates and, as long as ``db``
+    has an open transaction, none of the questions are inserted.
+    """
+    rows = (
+        (
+            quiz_pk,
+            question["text"],
+            json.dumps(question["answer"], ensure_ascii=False),
+            json.dumps(question["choices"], ensure_ascii=False)
+            if question.get("choices")
+            else "",
+            question["type"],
         )
-        assert 0.0 <= strength_weight <= 1.0
+        for question in questions
+    )
+    # `Database.insert_many` requires a list, so the statement is executed directly to
+    # avoid holding the whole file in memory. It sets the timestamp columns itself for
+    # the same reason.
+    db.cursor.executemany(
+        """
+        INSERT INTO
+          quiz_questions(
+            quiz, text, answer, choices, type, created_at, last_updated_at
+          )
+        VALUES
+          (?, ?, ?, ?, ?, STRFTIME('%s', 'now'), STRFTIME('%s', 'now'))
+        """,
+        rows,
+    )
+    return db.cursor.rowcount
 
-        weight = 0.8 * strength_weight + 0.2 * time_weight
-        assert 0.0 <= weight <= 1.0
 
-        weights.append(weight)
+def export_questions(db: Database, quiz_pk: int) -> Iterator[Question]:
+    """
+    Yields the quiz's questions, excluding deprecated questions, in the order they were
+    added, with the answer and choices decoded from JSON.
 
-    return weights
+    The rows are read from the database lazily, so ``db`` must not be used for anything
+    else until the iterator is exhausted.
+    """
+    rows = db.connection.execute(
+        """
+        SELECT
+          id, text, answer, choices, type
+        FROM
+          quiz_questions
+        WHERE
+          quiz = ? AND deprecated = 0
+        ORDER BY
+          id
+        """,
+        (quiz_pk,),
+    )
+    for row in rows:
+        yield {
+            "id": row["id"],
+            "text": row["text"],
+            "answer": json.loads(row["answer"]),
+            "choices": json.loads(row["choices"]) if row["choices"] else None,
+            "type": row["type"],
+        }
 
 
-def make_weighted_choice(choices: list, weights: List[float], count: int) -> list:
-    # Based on https://stackoverflow.com/a/3679747/
-    selected: list = []
+def parse_questions(quiz_name: str, lines: Iterable[str]) -> Iterator[Question]:
+    """
+    Yields the questions parsed from the lines, which are in the format accepted by
+    ``parse_question`` with questions separated by blank lines.
 
-    while len(selected) < count:
-        total = sum(weights)
-        r = random.uniform(0, total)
-        upto = 0.0
-        for i, (choice, weight) in enumerate(zip(choices, weights)):
-            if upto + weight >= r:
-                selected.append(choice)
-                choices = choices[:i] + choices[i + 1 :]
-                weights = weights[:i] + weights[i + 1 :]
-                break
+    The lines are consumed lazily, so a large file can be parsed as it is read.
+    """
+    block: List[str] = []
+    block_lineno = 1
+    for lineno, line in enumerate(lines, start=1):
+        line = line.strip()
+        if line:
+            if not block:
+                block_lineno = lineno
+            block.append(line)
+        elif block:
+            yield parse_question(quiz_name, block, block_lineno)
+            block = []
+
+    if block:
+        yield parse_question(quiz_name, block, block_lineno)
+
+
+def parse_questions_jsonl(lines: Iterable[str]) -> Iterator[Question]:
+    """
+    Yields the questions parsed from the lines, each of which is a JSON object as
+    written by ``kgx qexport --format jsonl``. Blank lines are ignored.
+    """
+    for lineno, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+
+        try:
+            question = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise DrillParseError(f"invalid JSON, line {lineno}: {e}")
+
+        if (
+            not isinstance(question, dict)
+            or "text" not in question
+            or "answer" not in question
+            or "type" not in question
+        ):
+            raise DrillParseError(
+                f"expected an object with text, answer and type keys, line {lineno}"
+            )
+
+        if not isinstance(question["text"], str) or not question["text"]:
+            raise DrillParseError(
+                f"expected text to be a non-empty string, line {lineno}"
+            )
+
+        question_type = question["type"]
+        if question_type not in QUESTION_TYPES:
+            raise DrillParseError(
+                f"unknown question type {question_type!r}, line {lineno}"
+            )
+
+        if question_type in ("ordered-list", "unordered-list"):
+            answer_is_valid = isinstance(question["answer"], list) and all(
+                _is_list_of_strings(answer_group) for answer_group in question["answer"]
+            )
+            if not answer_is_valid:
+                raise DrillParseError(
+                    f"expected answer to be a list of lists of strings, line {lineno}"
+                )
+        elif not _is_list_of_strings(question["answer"]):
+            raise DrillParseError(
+                f"expected answer to be a list of strings, line {lineno}"
+            )
 
-            upto += weight
+        choices = question.get("choices")
+        if choices is not None and not _is_list_of_strings(choices):
+            raise DrillParseError(
+                f"expected choices to be a list of strings, line {lineno}"
+            )
 
-    assert len(selected) == count
-    return selected
+        yield question
+
+
+def _is_list_of_strings(x: Any) -> bool:
+    return isinstance(x, list) and all(isinstance(y, str) for y in x)
 
 
-def score_question(question: Question, response: List[str]) -> int:
+def format_question(question: Question) -> List[str]:
     """
-    Returns the score of the response to the question, as an integer between 0 and 100.
+    Returns the lines of the question in the format accepted by ``parse_question``. The
+    question is numbered with its ``id`` if it has one.
     """
-    if question["type"] == "unordered-list":
-        points = 0
-        for answer in question["answer"]:
-            lower_case_answers = [a.lower() for a in answer]
-            for r in response:
-                r = r.lower() if r is not None else ""
-                if r in lower_case_answers:
-                    points += 1
-                    break
-        return math.floor((points / len(question["answer"])) * 100)
-    elif question["type"] == "ordered-list":
-        points = 0
-        for (r, answers) in zip(response, question["answer"]):
-            lower_case_answers = [a.lower() for a in answers]
-            if r.lower() in lower_case_answers:
-                points += 1
-        return math.floor((points / len(question["answer"])) * 100)
+    lines = [f"[{question.get('id', 1)}] {question['text']}"]
+
+    if question["type"] in ("ordered-list", "unordered-list"):
+        for answer_group in question["answer"]:
+            lines.append(" / ".join(answer_group))
     else:
-        r = response[0].lower()
-        if any(a.lower() == r for a in question["answer"]):
-            return 100
-        else:
-            return 0
+        lines.append(" / ".join(question["answer"]))
+
+    if question.get("choices"):
+        lines.append("- choices: " + " / ".join(question["choices"]))
+
+    if question["type"] == "ordered-list":
+        lines.append("- ordered: true")
+
+    return lines
 
 
 first_line_pattern = re.compile(r"^\[(.+)\] (.+)$")
@@ -0,0 +1,199 @@
+"""
+A simulation harness for the drill, for measuring how question selection performs and
+how question strengths evolve over time.
+
+The simulation creates a scratch database, populates it with synthetic quizzes, and
+takes quizzes day by day through the real ``drill.select_questions`` and
+``drill.submit_quiz``. Responses are generated by a synthetic answer model in which the
+chance of answering a question correctly rises with its strength.
+
+Run it from the command line with ``kgx drill-simulate``.
+"""
+
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from base import drill, schema
+from base.database import Database
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# The probability of answering a question correctly, by strength. The questions are
+# all short-answer, so a response is either entirely right or entirely wrong.
+CORRECT_PROBABILITIES = {
+    0: 0.3,
+    1: 0.45,
+    2: 0.6,
+    3: 0.7,
+    4: 0.8,
+    5: 0.85,
+    10: 0.95,
+}
+
+
+def simulate(
+    *,
+    quizzes: int = 20,
+    questions_per_quiz: int = 10,
+    days: int = 5,
+    quizzes_per_day: int = 2,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Runs the simulation in a scratch database that is deleted afterwards, and returns a
+    report with the following fields:
+
+    - ``selection_seconds``: the mean, median, and maximum latency of
+      ``select_questions``, in seconds.
+    - ``selection_statements`` and ``submission_statements``: the mean number of SQL
+      statements executed per call to ``select_questions`` and ``submit_quiz``.
+    - ``strengths``: for each day, a map from each strength to the number of questions
+      with that strength at the end of the day. The first entry is for the initial
+      state of the database.
+
+    The synthetic answer model and the question selection are both driven by a random
+    number generator seeded with ``seed``.
+    """
+    if quizzes < 3:
+        raise ValueError("the drill needs at least 3 quizzes")
+    if questions_per_quiz < 10:
+        raise ValueError("the drill needs at least 10 questions per quiz")
+
+    # `drill.select_questions` draws from the global random number generator, so it is
+    # seeded for the simulation and restored afterwards.
+    rng = random.Random(seed)
+    random_state = random.getstate()
+    random.seed(seed)
+    try:
+        return _simulate(rng, quizzes, questions_per_quiz, days, quizzes_per_day)
+    finally:
+        random.setstate(random_state)
+
+
+def _simulate(
+    rng: random.Random,
+    quizzes: int,
+    questions_per_quiz: int,
+    days: int,
+    quizzes_per_day: int,
+) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "simulation.sqlite3")
+        schema.create_database(path)
+
+        with Database(path=path) as db:
+            for statement in schema.INDEXES:
+                db.sql(statement)
+            _populate(db, quizzes, questions_per_quiz)
+
+        statement_count = 0
+
+        def trace(statement: str) -> None:
+            nonlocal statement_count
+            statement_count += 1
+
+        selection_seconds = []
+        selection_statements = []
+        submission_statements = []
+        strengths = []
+        now = int(time.time())
+        with Database(path=path) as db:
+            db.connection.set_trace_callback(trace)
+            strengths.append(_get_strength_distribution(db))
+
+            for _ in range(days):
+                for i in range(quizzes_per_day):
+                    # Spread the day's quizzes out over the waking hours.
+                    t = now + (i * 16 * 60 * 60) // quizzes_per_day
+
+                    statement_count = 0
+                    start = time.perf_counter()
+                    questions = drill.select_questions(db)
+                    selection_seconds.append(time.perf_counter() - start)
+                    selection_statements.append(statement_count)
+
+                    responses = [_answer(rng, question) for question in questions]
+                    statement_count = 0
+                    drill.submit_quiz(
+                        db, {"responses": responses}, now=t, prefetch=False
+                    )
+                    submission_statements.append(statement_count)
+
+                strengths.append(_get_strength_distribution(db))
+                now += SECONDS_PER_DAY
+
+            db.connection.set_trace_callback(None)
+
+    return {
+        "selection_seconds": {
+            "mean": statistics.mean(selection_seconds),
+            "median": statistics.median(selection_seconds),
+            "max": max(selection_seconds),
+        },
+        "selection_statements": statistics.mean(selection_statements),
+        "submission_statements": statistics.mean(submission_statements),
+        "strengths": strengths,
+    }
+
+
+def _populate(db: Database, quizzes: int, questions_per_quiz: int) -> None:
+    db.insert_many("quizzes", [{"name": f"Quiz {i}"} for i in range(quizzes)])
+    quiz_pks = [row[0] for row in db.sql("SELECT id FROM quizzes", as_tuple=True)]
+    db.insert_many(
+        "quiz_questions",
+        [
+            {
+                "quiz": quiz_pk,
+                "text": f"Question {j}",
+                "answer": json.dumps([f"answer {quiz_pk}-{j}"]),
+                "type": "short-answer",
+            }
+            for quiz_pk in quiz_pks
+            for j in range(questions_per_quiz)
+        ],
+    )
+
+
+def _answer(rng: random.Random, question: Dict[str, Any]) -> Dict[str, Any]:
+    # `submit_quiz` expects the question as returned by `drill.get_quiz`.
+    question["answer"] = json.loads(question["answer"])
+
+    if rng.random() < CORRECT_PROBABILITIES[question["strength"]]:
+        response = [question["answer"][0]]
+    else:
+        response = ["wrong answer"]
+
+    return {"question": question, "response": {"response": response}}
+
+
+def _get_strength_distribution(db: Database) -> Dict[int, int]:
+    rows = db.sql(
+        """
+        SELECT
+          strength, COUNT(*)
+        FROM
+          quiz_questions
+        GROUP BY
+          strength
+        ORDER BY
+          strength
+        """,
+        as_tuple=True,
+    )
+    return {strength: count for strength, count in rows}
+
+
+def format_strengths(strengths: List[Dict[int, int]]) -> List[List[int]]:
+    """
+    Formats the ``strengths`` field of the report as rows of a table, one per day, with
+    one column per strength in ``CORRECT_PROBABILITIES``.
+    """
+    return [
+        [day] + [distribution.get(strength, 0) for strength in CORRECT_PROBABILITIES]
+        for day, distribution in enumerate(strengths)
+    ]
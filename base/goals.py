@@ -1,9 +1,10 @@
 import datetime
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from base.database import Database, Row
 from base.exceptions import KhaganateImpossibleError
-from base.metrics import METRICS_MAP
+from base.metrics import METRICS_MAP, get_metric_values
+from base.utils import make_in_condition, month_range
 
 
 def list_current(db: Database, year: int, month: int) -> Dict[str, Row]:
@@ -28,9 +29,7 @@ def list_current(db: Database, year: int, month: int) -> Dict[str, Row]:
         values={"year": start_of_year},
     )
 
-    _set_progress(db, start_of_month, month_goals)
-    _set_progress(db, start_of_month, quarter_goals)
-    _set_progress(db, start_of_month, year_goals)
+    _set_progress(db, start_of_month, month_goals + quarter_goals + year_goals)
 
     return {
         "month_goals": month_goals,
@@ -40,8 +39,9 @@ def list_current(db: Database, year: int, month: int) -> Dict[str, Row]:
 
 
 def _set_progress(db: Database, today: datetime.date, goals: List[Row]) -> None:
+    auto_progress_map = get_auto_progress_for_goals(db, today, goals)
     for goal in goals:
-        auto_progress = get_auto_progress(db, today, goal)
+        auto_progress = auto_progress_map[goal["id"]]
         if auto_progress is None:
             # `auto_progress` tells the frontend not to allow the user to update the
             # progress manually.
@@ -57,55 +57,100 @@ def get_auto_progress(db: Database, today: datetime.date, goal: Row) -> Optional
 
     If progress cannot be calculated, then None is returned.
     """
-    if goal["progress"] is not None:
-        return None
-
-    if goal["progress_from_task"] is not None:
-        return _get_auto_progress_from_task(db, today, goal)
-
-    if goal["progress_from_metric"]:
-        return _get_auto_progress_from_metric(db, today, goal)
-
-    return None
-
-
-def _get_auto_progress_from_task(
-    db: Database, today: datetime.date, goal: Row
-) -> Optional[int]:
-    # The goal's progress is set to the open/closed status of a task.
-    task = db.get_by_pk("tasks", goal["progress_from_task"])
-    return goal["max_progress"] if task["status"] == "fixed" else 0
-
-
-def _get_auto_progress_from_metric(
-    db: Database, today: datetime.date, goal: Row
-) -> Optional[int]:
-    # The goal's progress is set to the value of a metric.
-    metric = goal["progress_from_metric"]
-    function = METRICS_MAP[metric]["function"]
-    if goal["timespan"] == "month":
-        value = function(db, today.year, today.month)
-    elif goal["timespan"] == "quarter":
-        value = 0
-
-        start_of_quarter = get_start_of_quarter(today)
-        for delta in range(3):
-            month = start_of_quarter.month + delta
-            if month > today.month:
-                break
-
-            value += function(db, today.year, month)
-    elif goal["timespan"] == "year":
-        value = 0
-        for month in range(1, 13):
-            if month > today.month:
-                break
-
-            value += function(db, today.year, month)
-    else:
-        raise KhaganateImpossibleError(goal["timespan"])
+    return get_auto_progress_for_goals(db, today, [goal])[goal["id"]]
+
+
+def get_auto_progress_for_goals(
+    db: Database, today: datetime.date, goals: List[Row]
+) -> Dict[int, Optional[int]]:
+    """
+    Same as ``get_auto_progress``, but for a list of goals at once. Returns a map from
+    goal IDs to progress.
+
+    Each metric is evaluated once over the widest range of months that any of the goals
+    needs, and the statuses of all linked tasks are fetched in a single query.
+    """
+    progress_map: Dict[int, Optional[int]] = {}
+    task_goals = []
+    metric_goals = []
+    for goal in goals:
+        progress_map[goal["id"]] = None
+        if goal["progress"] is not None:
+            continue
+
+        if goal["progress_from_task"] is not None:
+            task_goals.append(goal)
+        elif goal["progress_from_metric"]:
+            metric_goals.append(goal)
+
+    if task_goals:
+        # The goal's progress is set to the open/closed status of a task.
+        task_statuses = _get_task_statuses(
+            db, [goal["progress_from_task"] for goal in task_goals]
+        )
+        for goal in task_goals:
+            status = task_statuses[goal["progress_from_task"]]
+            progress_map[goal["id"]] = goal["max_progress"] if status == "fixed" else 0
+
+    if metric_goals:
+        # The goal's progress is set to the value of a metric.
+        widest_ranges: Dict[str, Tuple[datetime.date, datetime.date]] = {}
+        for goal in metric_goals:
+            start, end = get_month_range_for_goal(today, goal["timespan"])
+            metric = goal["progress_from_metric"]
+            if metric in widest_ranges:
+                widest_start, widest_end = widest_ranges[metric]
+                widest_ranges[metric] = (min(start, widest_start), max(end, widest_end))
+            else:
+                widest_ranges[metric] = (start, end)
+
+        metric_values: Dict[str, Dict[datetime.date, Any]] = {}
+        for metric, (start, end) in widest_ranges.items():
+            values = get_metric_values(db, METRICS_MAP[metric], start, end)
+            metric_values[metric] = dict(zip(month_range(start, end), values))
+
+        for goal in metric_goals:
+            values_by_month = metric_values[goal["progress_from_metric"]]
+            start, end = get_month_range_for_goal(today, goal["timespan"])
+            if goal["timespan"] == "month":
+                value = values_by_month[start]
+            else:
+                value = 0
+                for month in month_range(start, end):
+                    value += values_by_month[month]
+
+            progress_map[goal["id"]] = value
+
+    return progress_map
+
+
+def _get_task_statuses(db: Database, task_pks: List[int]) -> Dict[int, str]:
+    values: Dict[str, Any] = {}
+    in_condition = make_in_condition("id", set(task_pks), values)
+    rows = db.sql(
+        f"SELECT id, status FROM tasks WHERE {in_condition}",
+        values=values,
+        as_tuple=True,
+    )
+    return dict(rows)
+
 
-    return value
+def get_month_range_for_goal(
+    today: datetime.date, timespan: str
+) -> Tuple[datetime.date, datetime.date]:
+    """
+    Returns the first days of the first and last months whose metric values count
+    towards the progress of a goal with the given timespan, as of ``today``.
+    """
+    start_of_month = today.replace(day=1)
+    if timespan == "month":
+        return start_of_month, start_of_month
+    elif timespan == "quarter":
+        return get_start_of_quarter(today), start_of_month
+    elif timespan == "year":
+        return start_of_month.replace(month=1), start_of_month
+    else:
+        raise KhaganateImpossibleError(timespan)
 
 
 def get_start_of_quarter(date: datetime.date) -> datetime.date:
@@ -0,0 +1,567 @@
+"""
+Reading and writing the calendar tables in the iCalendar format (RFC 5545).
+
+Only the subset of the format that the calendar tables can represent is supported:
+single events, and weekly, weekday and yearly recurrences with cancelled or
+rescheduled occurrences. Both directions work line by line, so exporting or importing
+a calendar takes constant memory regardless of its size.
+"""
+import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from base.calendar import get_occurrences
+from base.database import Database, Row
+
+PRODID = "-//Khaganate//Calendar//EN"
+
+# The number of rows to buffer before inserting them during an import.
+IMPORT_BATCH_SIZE = 500
+
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR")
+
+
+def export_calendar(db: Database) -> Iterator[str]:
+    """
+    Yields the lines of an iCalendar file, each terminated with CRLF, containing every
+    calendar event and recurring event.
+
+    The rows are read from the database lazily, so ``db`` must not be used for anything
+    else until the iterator is exhausted.
+    """
+    yield from _format_lines(
+        [("BEGIN", "VCALENDAR"), ("VERSION", "2.0"), ("PRODID", PRODID)]
+    )
+
+    events = db.connection.execute("SELECT * FROM calendar_events ORDER BY id")
+    for event in events:
+        yield from _format_lines(_export_event(event))
+
+    # The exceptions are read in the same order as the recurring events so that each
+    # recurring event's exceptions can be collected without holding the whole table in
+    # memory.
+    recurring_events = db.connection.execute(
+        "SELECT * FROM calendar_recurring_events ORDER BY id"
+    )
+    exceptions = db.connection.execute(
+        """
+        SELECT
+          *
+        FROM
+          calendar_recurring_event_exceptions
+        ORDER BY
+          recurring_event, date
+        """
+    )
+    exception = next(exceptions, None)
+    for recurring_event in recurring_events:
+        while (
+            exception is not None
+            and exception["recurring_event"] < recurring_event["id"]
+        ):
+            exception = next(exceptions, None)
+
+        event_exceptions = []
+        while (
+            exception is not None
+            and exception["recurring_event"] == recurring_event["id"]
+        ):
+            event_exceptions.append(exception)
+            exception = next(exceptions, None)
+
+        yield from _format_lines(
+            _export_recurring_event(recurring_event, event_exceptions)
+        )
+
+    yield from _format_lines([("END", "VCALENDAR")])
+
+
+def import_calendar(db: Database, lines: Iterable[str]) -> Dict[str, int]:
+    """
+    Inserts the events in the iCalendar file into the calendar tables, and returns the
+    number of rows inserted into each table, as well as the number of events that were
+    skipped because the calendar tables cannot represent them.
+
+    ``lines`` is consumed lazily, and rows are inserted in batches, so a large file can
+    be imported as it is read. The caller should import the file in a single transaction
+    so that a parsing error partway through does not leave a partial import.
+
+    Times in UTC are converted to local time; times in other time zones are imported
+    as-is. Importing the same file twice creates duplicate events.
+    """
+    counts = {
+        "calendar_events": 0,
+        "calendar_recurring_events": 0,
+        "calendar_recurring_event_exceptions": 0,
+        "skipped": 0,
+    }
+
+    event_rows: List[Row] = []
+    exception_rows: List[Row] = []
+    # Map from the UID of each imported recurring event to its primary key, for
+    # attaching rescheduled occurrences, which may appear before or after the recurring
+    # event in the file.
+    recurring_event_uids: Dict[str, int] = {}
+    rescheduled: List[Dict[str, Any]] = []
+
+    def flush(force: bool = False) -> None:
+        if force or len(event_rows) >= IMPORT_BATCH_SIZE:
+            db.insert_many("calendar_events", event_rows)
+            counts["calendar_events"] += len(event_rows)
+            event_rows.clear()
+
+        if force or len(exception_rows) >= IMPORT_BATCH_SIZE:
+            db.insert_many("calendar_recurring_event_exceptions", exception_rows)
+            counts["calendar_recurring_event_exceptions"] += len(exception_rows)
+            exception_rows.clear()
+
+    for component in _parse_events(lines):
+        if "RECURRENCE-ID" in component:
+            rescheduled.append(component)
+            continue
+
+        if "RRULE" not in component:
+            row = _import_event(component)
+            if row is None:
+                counts["skipped"] += 1
+            else:
+                event_rows.append(row)
+            flush()
+            continue
+
+        imported = _import_recurring_event(component)
+        if imported is None:
+            counts["skipped"] += 1
+            continue
+
+        row, exdates = imported
+        pk = db.insert("calendar_recurring_events", row)
+        counts["calendar_recurring_events"] += 1
+        if "UID" in component:
+            recurring_event_uids[component["UID"][0][1]] = pk
+
+        for date in exdates:
+            exception_rows.append(
+                {"recurring_event": pk, "date": date, "start": None, "end": None}
+            )
+        flush()
+
+    for component in rescheduled:
+        uid = component["UID"][0][1] if "UID" in component else None
+        start = _get_datetime(component, "DTSTART")
+        end = _get_datetime(component, "DTEND")
+        recurrence_id = _get_datetime(component, "RECURRENCE-ID")
+        if (
+            uid not in recurring_event_uids
+            or not isinstance(start, datetime.datetime)
+            or not isinstance(end, datetime.datetime)
+            or recurrence_id is None
+        ):
+            counts["skipped"] += 1
+            continue
+
+        date = _to_date(recurrence_id)
+        if start.date() == date and end.date() == date:
+            exception_rows.append(
+                {
+                    "recurring_event": recurring_event_uids[uid],
+                    "date": date,
+                    "start": start.time(),
+                    "end": end.time(),
+                }
+            )
+        else:
+            # Exceptions can only change the time of an occurrence, so an occurrence
+            # that was moved to another day is cancelled and imported as a single
+            # event instead.
+            exception_rows.append(
+                {
+                    "recurring_event": recurring_event_uids[uid],
+                    "date": date,
+                    "start": None,
+                    "end": None,
+                }
+            )
+            event_rows.append(_import_event(component))
+
+    flush(force=True)
+    return counts
+
+
+def _export_event(event: Row) -> List[Tuple[str, str]]:
+    lines = [
+        ("BEGIN", "VEVENT"),
+        ("UID", f"calendar-event-{event['id']}@khaganate"),
+        ("DTSTAMP", _format_timestamp(event["last_updated_at"])),
+    ]
+    if event["start"] is None:
+        lines.append(("DTSTART;VALUE=DATE", _format_date(event["start_date"])))
+        lines.append(
+            (
+                "DTEND;VALUE=DATE",
+                _format_date(event["end_date"] + datetime.timedelta(days=1)),
+            )
+        )
+    else:
+        lines.append(("DTSTART", _format_datetime(event["start_date"], event["start"])))
+        if event["end"] is not None:
+            lines.append(("DTEND", _format_datetime(event["end_date"], event["end"])))
+        elif event["end_date"] != event["start_date"]:
+            # iCalendar cannot express an end date without an end time.
+            lines.append(("X-KHAGANATE-END-DATE", _format_date(event["end_date"])))
+
+    lines.extend(_export_text_fields(event))
+    if event["maybe"]:
+        lines.append(("STATUS", "TENTATIVE"))
+    if event["travel_time"]:
+        lines.append(("X-KHAGANATE-TRAVEL-TIME", str(event["travel_time"])))
+    lines.append(("END", "VEVENT"))
+    return lines
+
+
+def _export_recurring_event(
+    recurring_event: Row, exceptions: List[Row]
+) -> List[Tuple[str, str]]:
+    uid = f"calendar-recurring-event-{recurring_event['id']}@khaganate"
+
+    # The start of an iCalendar recurrence always counts as an occurrence, so it must be
+    # the first real occurrence rather than `recurrence_start`, which may fall on a
+    # weekend for weekday events.
+    first = next(
+        get_occurrences(
+            recurring_event,
+            recurring_event["recurrence_start"],
+            recurring_event["recurrence_start"] + datetime.timedelta(days=7),
+        ),
+        recurring_event["recurrence_start"],
+    )
+
+    rrule = {
+        "weekdays": "FREQ=WEEKLY;BYDAY=" + ",".join(WEEKDAYS),
+        "weekly": "FREQ=WEEKLY",
+        "yearly": "FREQ=YEARLY",
+    }[recurring_event["recurrence"]]
+    if recurring_event["recurrence_end"] is not None:
+        rrule += ";UNTIL=" + _format_datetime(
+            recurring_event["recurrence_end"], datetime.time(23, 59, 59)
+        )
+
+    lines = [
+        ("BEGIN", "VEVENT"),
+        ("UID", uid),
+        ("DTSTAMP", _format_timestamp(recurring_event["last_updated_at"])),
+        ("DTSTART", _format_datetime(first, recurring_event["start"])),
+        ("DTEND", _format_datetime(first, recurring_event["end"])),
+        ("RRULE", rrule),
+    ]
+    lines.extend(_export_text_fields(recurring_event))
+    for exception in exceptions:
+        if not exception["start"] or not exception["end"]:
+            lines.append(
+                (
+                    "EXDATE",
+                    _format_datetime(exception["date"], recurring_event["start"]),
+                )
+            )
+    lines.append(("END", "VEVENT"))
+
+    # Rescheduled occurrences are separate events that override a single occurrence of
+    # the recurring event.
+    for exception in exceptions:
+        if not exception["start"] or not exception["end"]:
+            continue
+
+        lines.extend(
+            [
+                ("BEGIN", "VEVENT"),
+                ("UID", uid),
+                ("DTSTAMP", _format_timestamp(exception["last_updated_at"])),
+                (
+                    "RECURRENCE-ID",
+                    _format_datetime(exception["date"], recurring_event["start"]),
+                ),
+                ("DTSTART", _format_datetime(exception["date"], exception["start"])),
+                ("DTEND", _format_datetime(exception["date"], exception["end"])),
+            ]
+        )
+        lines.extend(_export_text_fields(recurring_event))
+        lines.append(("END", "VEVENT"))
+
+    return lines
+
+
+def _export_text_fields(row: Row) -> List[Tuple[str, str]]:
+    lines = [("SUMMARY", _escape(row["title"]))]
+    if row["description"]:
+        lines.append(("DESCRIPTION", _escape(row["description"])))
+    if row["location"]:
+        lines.append(("LOCATION", _escape(row["location"])))
+    return lines
+
+
+def _import_event(component: Dict[str, Any]) -> Optional[Row]:
+    start = _get_datetime(component, "DTSTART")
+    end = _get_datetime(component, "DTEND")
+    if start is None:
+        return None
+
+    row = {
+        "title": _get_text(component, "SUMMARY") or "",
+        "description": _get_text(component, "DESCRIPTION") or "",
+        "location": _get_text(component, "LOCATION") or "",
+        "maybe": _get_text(component, "STATUS") == "TENTATIVE",
+        "travel_time": int(_get_text(component, "X-KHAGANATE-TRAVEL-TIME") or 0),
+    }
+    if isinstance(start, datetime.datetime):
+        row["start_date"] = start.date()
+        row["start"] = start.time()
+        if isinstance(end, datetime.datetime):
+            row["end_date"] = end.date()
+            row["end"] = end.time()
+        else:
+            end_date = _get_datetime(component, "X-KHAGANATE-END-DATE")
+            row["end_date"] = _to_date(end_date) if end_date else start.date()
+            row["end"] = None
+    else:
+        # The end of an all-day event is exclusive.
+        row["start_date"] = start
+        row["start"] = None
+        row["end_date"] = (
+            max(start, end - datetime.timedelta(days=1)) if end is not None else start
+        )
+        row["end"] = None
+
+    return row
+
+
+def _import_recurring_event(
+    component: Dict[str, Any],
+) -> Optional[Tuple[Row, List[datetime.date]]]:
+    start = _get_datetime(component, "DTSTART")
+    end = _get_datetime(component, "DTEND")
+    # Recurring events must have a start and end time.
+    if not isinstance(start, datetime.datetime) or not isinstance(
+        end, datetime.datetime
+    ):
+        return None
+
+    rule = dict(
+        part.split("=", 1)
+        for part in component["RRULE"][0][1].upper().split(";")
+        if "=" in part
+    )
+    frequency = rule.pop("FREQ", None)
+    by_day = rule.pop("BYDAY", None)
+    until = rule.pop("UNTIL", None)
+    count = rule.pop("COUNT", None)
+    # The start of the week only matters for rules with an interval.
+    rule.pop("WKST", None)
+    if rule.pop("INTERVAL", "1") != "1":
+        return None
+    # Any other parts of the rule cannot be represented.
+    if rule:
+        return None
+
+    weekday = WEEKDAYS[start.weekday()] if start.weekday() < 5 else None
+    if frequency in ("DAILY", "WEEKLY") and by_day == ",".join(WEEKDAYS):
+        recurrence = "weekdays"
+    elif frequency == "WEEKLY" and by_day in (None, weekday):
+        recurrence = "weekly"
+    elif frequency == "YEARLY" and by_day is None:
+        recurrence = "yearly"
+    else:
+        return None
+
+    row = {
+        "title": _get_text(component, "SUMMARY") or "",
+        "description": _get_text(component, "DESCRIPTION") or "",
+        "location": _get_text(component, "LOCATION") or "",
+        "start": start.time(),
+        "end": end.time(),
+        "recurrence": recurrence,
+        "recurrence_start": start.date(),
+        "recurrence_end": None,
+    }
+    if until is not None:
+        row["recurrence_end"] = _to_date(_parse_datetime(until, {}))
+    elif count is not None:
+        # Find the date of the last occurrence by stepping through the occurrences.
+        # The number of occurrences is bounded, so this terminates.
+        n = int(count)
+        last = start.date()
+        horizon = datetime.timedelta(days=366 * (n + 1))
+        for i, date in enumerate(get_occurrences(row, last, last + horizon), start=1):
+            last = date
+            if i == n:
+                break
+        row["recurrence_end"] = last
+
+    exdates = []
+    for params, value in component.get("EXDATE", []):
+        for part in value.split(","):
+            exdates.append(_to_date(_parse_datetime(part, params)))
+
+    return row, exdates
+
+
+def _parse_events(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the properties of each VEVENT component in the file, as a map from property
+    name to a list of ``(params, value)`` pairs. Components nested within events, e.g.
+    alarms, are ignored.
+    """
+    event: Optional[Dict[str, Any]] = None
+    depth = 0
+    for line in _unfold(lines):
+        name, params, value = _parse_property(line)
+        if name == "BEGIN":
+            if event is not None:
+                depth += 1
+            elif value.upper() == "VEVENT":
+                event = {}
+        elif name == "END":
+            if depth > 0:
+                depth -= 1
+            elif event is not None and value.upper() == "VEVENT":
+                yield event
+                event = None
+        elif event is not None and depth == 0:
+            event.setdefault(name, []).append((params, value))
+
+
+def _unfold(lines: Iterable[str]) -> Iterator[str]:
+    # Long lines are folded by inserting a line break followed by a space or a tab.
+    current: Optional[str] = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+        else:
+            if current:
+                yield current
+            current = line
+
+    if current:
+        yield current
+
+
+def _parse_property(line: str) -> Tuple[str, Dict[str, str], str]:
+    # Parameter values may be quoted and contain colons and semicolons, so the line is
+    # scanned character by character up to the colon that begins the value.
+    in_quotes = False
+    for i, c in enumerate(line):
+        if c == '"':
+            in_quotes = not in_quotes
+        elif c == ":" and not in_quotes:
+            break
+    else:
+        raise ICalendarParseError(f"malformed line: {line!r}")
+
+    name, *raw_params = line[:i].split(";")
+    params = {}
+    for param in raw_params:
+        key, _, param_value = param.partition("=")
+        params[key.upper()] = param_value.strip('"')
+    return name.upper(), params, line[i + 1 :]
+
+
+def _get_text(component: Dict[str, Any], name: str) -> Optional[str]:
+    if name not in component:
+        return None
+    return _unescape(component[name][0][1])
+
+
+def _get_datetime(component: Dict[str, Any], name: str) -> Any:
+    if name not in component:
+        return None
+    params, value = component[name][0]
+    return _parse_datetime(value, params)
+
+
+def _parse_datetime(value: str, params: Dict[str, str]) -> Any:
+    """
+    Parses an iCalendar DATE or DATE-TIME value. Returns a ``datetime.date`` for a DATE
+    value and a naive ``datetime.datetime`` in local time for a DATE-TIME value.
+    """
+    try:
+        if params.get("VALUE") == "DATE" or "T" not in value:
+            return datetime.datetime.strptime(value, "%Y%m%d").date()
+
+        if value.endswith("Z"):
+            utc = datetime.datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(
+                tzinfo=datetime.timezone.utc
+            )
+            return utc.astimezone().replace(tzinfo=None)
+
+        return datetime.datetime.strptime(value, "%Y%m%dT%H%M%S")
+    except ValueError:
+        raise ICalendarParseError(f"malformed date or time: {value!r}")
+
+
+def _to_date(value: Any) -> datetime.date:
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+def _format_lines(lines: Iterable[Tuple[str, str]]) -> Iterator[str]:
+    for name, value in lines:
+        yield _fold(f"{name}:{value}") + "\r\n"
+
+
+def _fold(line: str) -> str:
+    # Lines must be at most 75 octets long, not counting the line break. Continuation
+    # lines begin with a space, which counts towards their length.
+    parts = []
+    current = ""
+    current_length = 0
+    for c in line:
+        n = len(c.encode("utf8"))
+        if current_length + n > 75:
+            parts.append(current)
+            current = " "
+            current_length = 1
+        current += c
+        current_length += n
+    parts.append(current)
+    return "\r\n".join(parts)
+
+
+def _escape(text: str) -> str:
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _unescape(text: str) -> str:
+    result = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == "\\" and i + 1 < len(text):
+            following = text[i + 1]
+            result.append("\n" if following in "nN" else following)
+            i += 2
+        else:
+            result.append(c)
+            i += 1
+    return "".join(result)
+
+
+def _format_date(date: datetime.date) -> str:
+    return date.strftime("%Y%m%d")
+
+
+def _format_datetime(date: datetime.date, time: datetime.time) -> str:
+    return datetime.datetime.combine(date, time).strftime("%Y%m%dT%H%M%S")
+
+
+def _format_timestamp(timestamp: int) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime(
+        "%Y%m%dT%H%M%SZ"
+    )
+
+
+class ICalendarParseError(Exception):
+    pass
@@ -1,9 +1,18 @@
 import datetime
 import decimal
-from typing import Any, Dict, List, Optional, Union, cast
+import functools
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union, cast
 
 from base import books as books_service
 from base.database import Database
+from base.utils import (
+    count_days_of_overlap,
+    get_days_in_month,
+    make_in_condition,
+    month_range,
+)
+from sqliteparser import quote
 
 
 def get_metric(db: Database, metric_name: str) -> Optional[Dict[str, Any]]:
@@ -16,34 +25,157 @@ def get_metric(db: Database, metric_name: str) -> Optional[Dict[str, Any]]:
     if metric is None:
         return None
 
-    values = []
-    month = metric["start"]
+    start = metric["start"]
     end = datetime.date.today() if metric["end"] is None else metric["end"]
-    while month <= end:
-        values.append(
-            (month.isoformat(), metric["function"](db, month.year, month.month))
+
+    # Use precomputed values from the cache as far as possible, and compute the rest
+    # (usually just the current month) on the spot.
+    values_by_month = _get_cached_values(db, [metric], start, end)[metric["name"]]
+    months = list(month_range(start, end))
+    first_uncached = next((m for m in months if m not in values_by_month), None)
+    if first_uncached is not None:
+        values_by_month.update(
+            zip(
+                month_range(first_uncached, end),
+                get_metric_values(db, metric, first_uncached, end),
+            )
         )
-        if month.month < 12:
-            month = datetime.date(month.year, month.month + 1, 1)
-        else:
-            month = datetime.date(month.year + 1, 1, 1)
 
     del metric["function"]
-    metric["values"] = values
+    del metric["range_function"]
+    del metric["tables"]
+    metric["values"] = [(month.isoformat(), values_by_month[month]) for month in months]
 
     return metric
 
 
+def get_metric_values(
+    db: Database, metric: Dict[str, Any], start: datetime.date, end: datetime.date
+) -> List[Any]:
+    """
+    Returns the values of the metric for each month from ``start`` to ``end``,
+    inclusive.
+
+    Metrics with a ``range_function`` are computed for the whole range at once; other
+    metrics are computed one month at a time.
+    """
+    if metric["range_function"] is not None:
+        return metric["range_function"](db, start, end)
+
+    return [
+        metric["function"](db, month.year, month.month)
+        for month in month_range(start, end)
+    ]
+
+
+DEFAULT_ANALYTICS_WINDOW = 12
+
+
+def get_metric_analytics(
+    db: Database, metric_name: str, window: int = DEFAULT_ANALYTICS_WINDOW
+) -> Optional[Dict[str, Any]]:
+    """
+    Returns the same payload as ``get_metric`` along with series derived from the
+    monthly values: a rolling mean, the change from the same month of the previous
+    year, the cumulative sum, and rolling 10th/50th/90th percentile bands.
+
+    :param window: The number of months in the rolling window, which must be positive.
+    """
+    if window < 1:
+        raise ValueError(f"window must be a positive integer, not {window}")
+
+    metric = get_metric(db, metric_name)
+    if metric is None:
+        return None
+
+    values = tuple(None if v is None else float(v) for _, v in metric["values"])
+    metric["window"] = window
+    metric.update(derive_series(values, window))
+    return metric
+
+
+# The derived series are cached on the monthly values themselves, so a change to any
+# month's value is a cache miss rather than a stale result.
+@functools.lru_cache(maxsize=128)
+def derive_series(
+    values: Tuple[Optional[float], ...], window: int
+) -> Dict[str, Tuple[Optional[float], ...]]:
+    """
+    Computes the series returned by ``get_metric_analytics`` from a tuple of monthly
+    values, where ``None`` means that the value is missing for that month.
+
+    A rolling value is ``None`` unless every month in its window has a value.
+    """
+    n = len(values)
+
+    rolling_mean: List[Optional[float]] = [None] * n
+    percentile_10: List[Optional[float]] = [None] * n
+    percentile_50: List[Optional[float]] = [None] * n
+    percentile_90: List[Optional[float]] = [None] * n
+    missing_in_window = 0
+    for i, value in enumerate(values):
+        if value is None:
+            missing_in_window += 1
+
+        if i >= window and values[i - window] is None:
+            missing_in_window -= 1
+
+        if i >= window - 1 and missing_in_window == 0:
+            in_window = sorted(cast(Sequence[float], values[i - window + 1 : i + 1]))
+            rolling_mean[i] = sum(in_window) / window
+            percentile_10[i] = _percentile(in_window, 10)
+            percentile_50[i] = _percentile(in_window, 50)
+            percentile_90[i] = _percentile(in_window, 90)
+
+    yoy_delta: List[Optional[float]] = [None] * n
+    for i in range(12, n):
+        current, previous = values[i], values[i - 12]
+        if current is not None and previous is not None:
+            yoy_delta[i] = current - previous
+
+    cumulative: List[Optional[float]] = []
+    total = 0.0
+    for value in values:
+        total += value or 0.0
+        cumulative.append(total)
+
+    return {
+        "rolling_mean": tuple(rolling_mean),
+        "yoy_delta": tuple(yoy_delta),
+        "cumulative": tuple(cumulative),
+        "percentile_10": tuple(percentile_10),
+        "percentile_50": tuple(percentile_50),
+        "percentile_90": tuple(percentile_90),
+    }
+
+
+def _percentile(sorted_values: Sequence[float], p: float) -> float:
+    # Linear interpolation between the closest ranks, like NumPy's default.
+    k = (len(sorted_values) - 1) * (p / 100)
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (
+        k - lower
+    )
+
+
 def list_metrics(db: Database, year: int, month: int) -> List[Dict[str, Any]]:
     month_object = datetime.date(year, month, 1)
 
-    response = []
-    for metric in cast(List[Dict[str, Any]], METRICS):
-        if month_object < metric["start"]:
-            continue
+    active_metrics = [
+        metric
+        for metric in cast(List[Dict[str, Any]], METRICS)
+        if metric["start"] <= month_object
+        and (metric["end"] is None or month_object < metric["end"])
+    ]
+    cached_values = _get_cached_values(db, active_metrics, month_object, month_object)
 
-        if metric["end"] is not None and month_object >= metric["end"]:
-            continue
+    response = []
+    for metric in active_metrics:
+        if month_object in cached_values[metric["name"]]:
+            value = cached_values[metric["name"]][month_object]
+        else:
+            value = metric["function"](db, year, month)
 
         response.append(
             {
@@ -51,7 +183,7 @@ def list_metrics(db: Database, year: int, month: int) -> List[Dict[str, Any]]:
                 "displayTitle": metric["display_title"],
                 "group": metric["group"],
                 "type": metric["type"],
-                "value": metric["function"](db, year, month),
+                "value": value,
                 "good_threshold": metric["good_threshold"],
                 "bad_threshold": metric["bad_threshold"],
                 "higher_is_better": metric["higher_is_better"],
@@ -61,6 +193,223 @@ def list_metrics(db: Database, year: int, month: int) -> List[Dict[str, Any]]:
     return response
 
 
+def refresh_metric_cache(db: Database, through: datetime.date) -> int:
+    """
+    Precomputes the value of every metric for every month up to and including the
+    month of ``through`` and stores them in the ``metric_cache`` table.
+
+    Months that are already cached are skipped unless one of the metric's source tables
+    has changed since they were computed, in which case the metric's whole range is
+    recomputed. Returns the number of values that were written.
+    """
+    cacheable_metrics = [
+        metric for metric in METRICS if metric["tables"] and metric["start"] <= through
+    ]
+    fingerprints = _get_table_fingerprints(db, cacheable_metrics)
+
+    cache_rows = db.sql(
+        "SELECT name, month, last_updated_at, source_rows FROM metric_cache",
+        as_tuple=True,
+    )
+    cached_by_metric: Dict[str, Dict[datetime.date, Tuple[int, Optional[int]]]] = {}
+    for name, month, computed_at, source_rows in cache_rows:
+        cached_by_metric.setdefault(name, {})[month] = (computed_at, source_rows)
+
+    written = 0
+    for metric in cacheable_metrics:
+        start = metric["start"]
+        end = through if metric["end"] is None else min(through, metric["end"])
+        cached = cached_by_metric.get(metric["name"], {})
+        last_changed_at, source_rows = _get_metric_fingerprint(metric, fingerprints)
+
+        if any(
+            computed_at <= last_changed_at or cached_source_rows != source_rows
+            for computed_at, cached_source_rows in cached.values()
+        ):
+            first_month_to_compute: Optional[datetime.date] = start
+        else:
+            first_month_to_compute = next(
+                (m for m in month_range(start, end) if m not in cached), None
+            )
+
+        if first_month_to_compute is None:
+            continue
+
+        values = get_metric_values(db, metric, first_month_to_compute, end)
+        db.delete(
+            "metric_cache",
+            where="name = :name AND month >= :start",
+            values={"name": metric["name"], "start": first_month_to_compute},
+        )
+        months = month_range(first_month_to_compute, end)
+        db.insert_many(
+            "metric_cache",
+            [
+                {
+                    "name": metric["name"],
+                    "month": month,
+                    "value": value,
+                    "source_rows": source_rows,
+                }
+                for month, value in zip(months, values)
+            ],
+        )
+        written += len(values)
+
+    return written
+
+
+def _get_cached_values(
+    db: Database,
+    metrics: List[Dict[str, Any]],
+    start: datetime.date,
+    end: datetime.date,
+) -> Dict[str, Dict[datetime.date, Any]]:
+    """
+    Returns the cached values of the metrics from ``start`` to ``end``, as a map from
+    metric name to a map from month to value. Stale values are left out.
+    """
+    cached_values: Dict[str, Dict[datetime.date, Any]] = {
+        metric["name"]: {} for metric in metrics
+    }
+    cacheable_metrics = {
+        metric["name"]: metric for metric in metrics if metric["tables"]
+    }
+    if not cacheable_metrics:
+        return cached_values
+
+    values = {"start": start.isoformat(), "end": end.isoformat()}
+    in_condition = make_in_condition("name", cacheable_metrics, values)
+    cache_rows = db.sql(
+        f"""
+        SELECT
+          name, month, value, last_updated_at, source_rows
+        FROM
+          metric_cache
+        WHERE
+          {in_condition}
+        AND
+          month BETWEEN :start AND :end
+        """,
+        values=values,
+        as_tuple=True,
+    )
+    if not cache_rows:
+        return cached_values
+
+    fingerprints = _get_table_fingerprints(db, list(cacheable_metrics.values()))
+    for name, month, value, computed_at, source_rows in cache_rows:
+        metric = cacheable_metrics[name]
+        last_changed_at, current_source_rows = _get_metric_fingerprint(
+            metric, fingerprints
+        )
+        if computed_at <= last_changed_at or source_rows != current_source_rows:
+            continue
+
+        # The cache stores every value as a decimal.
+        if value is not None and metric["type"] == "integer":
+            value = int(value)
+
+        cached_values[name][month] = value
+
+    return cached_values
+
+
+def _get_table_fingerprints(
+    db: Database, metrics: List[Dict[str, Any]]
+) -> Dict[str, Tuple[int, int]]:
+    """
+    Returns a map from each of the metrics' source tables to the latest
+    ``last_updated_at`` timestamp in the table (or 0 if the table is empty) and the
+    number of rows in the table.
+    """
+    tables = sorted({table for metric in metrics for table in metric["tables"]})
+    if not tables:
+        return {}
+
+    query = " UNION ALL ".join(
+        f"SELECT '{table}', MAX(last_updated_at), COUNT(*) FROM {quote(table)}"
+        for table in tables
+    )
+    return {table: (t or 0, n) for table, t, n in db.sql(query, as_tuple=True)}
+
+
+def _get_metric_fingerprint(
+    metric: Dict[str, Any], fingerprints: Dict[str, Tuple[int, int]]
+) -> Tuple[int, int]:
+    """
+    Returns the latest ``last_updated_at`` timestamp across the metric's source tables
+    and the total number of rows in them. A deletion does not move the timestamp, but
+    it does change the number of rows.
+    """
+    return (
+        max(fingerprints[table][0] for table in metric["tables"]),
+        sum(fingerprints[table][1] for table in metric["tables"]),
+    )
+
+
+def profile_metrics(
+    db: Database, metric_names: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Evaluates each metric for every month in its range, recording the number of SQL
+    statements executed and the wall time for each month. Metrics that have a
+    ``range_function`` are also profiled computing their whole range at once.
+
+    The return value is a list with one dictionary per metric, sorted by total time in
+    descending order. It is used by ``kgx metrics-profile``.
+    """
+    statement_count = 0
+
+    def count_statement(statement: str) -> None:
+        nonlocal statement_count
+        statement_count += 1
+
+    def measure(f, *args) -> Dict[str, Any]:
+        statements_before = statement_count
+        start_time = time.perf_counter()
+        f(db, *args)
+        return {
+            "seconds": time.perf_counter() - start_time,
+            "statements": statement_count - statements_before,
+        }
+
+    profiles = []
+    db.connection.set_trace_callback(count_statement)
+    try:
+        for metric in METRICS:
+            if metric_names and metric["name"] not in metric_names:
+                continue
+
+            start = metric["start"]
+            end = datetime.date.today() if metric["end"] is None else metric["end"]
+            months = []
+            for month in month_range(start, end):
+                measurement = measure(metric["function"], month.year, month.month)
+                measurement["month"] = month.isoformat()
+                months.append(measurement)
+
+            if metric["range_function"] is not None:
+                range_measurement = measure(metric["range_function"], start, end)
+            else:
+                range_measurement = None
+
+            profiles.append(
+                {
+                    "name": metric["name"],
+                    "seconds": sum(m["seconds"] for m in months),
+                    "statements": sum(m["statements"] for m in months),
+                    "months": months,
+                    "range": range_measurement,
+                }
+            )
+    finally:
+        db.connection.set_trace_callback(None)
+
+    profiles.sort(key=lambda profile: profile["seconds"], reverse=True)
+    return profiles
+
+
 def D(
     n: Union[float, int], *, places: int, rounding=decimal.ROUND_DOWN
 ) -> decimal.Decimal:
@@ -144,12 +493,72 @@ def metric_total_expenses(
 
 
 def metric_books_read(db: Database, year: int, month: int) -> decimal.Decimal:
-    books = books_service.list_books(db, year, month)
-    return D(
-        sum(book["value_in_interval"] for book in books),
-        places=2,
+    month_object = datetime.date(year, month, 1)
+    return range_metric_books_read(db, month_object, month_object)[0]
+
+
+def range_metric_books_read(
+    db: Database, start: datetime.date, end: datetime.date
+) -> List[decimal.Decimal]:
+    """
+    Computes the ``books_read`` metric for every month from ``start`` to ``end`` with a
+    single query.
+
+    Each finished book's value is distributed across the months that it was read in,
+    in proportion to the number of days of reading that fell in each month.
+    """
+    months = list(month_range(start, end))
+    if not months:
+        return []
+
+    first_day = months[0]
+    last_day = months[-1].replace(
+        day=get_days_in_month(months[-1].year, months[-1].month)
+    )
+
+    # Abandoned and unfinished books count for nothing, so they are filtered out here
+    # instead of being distributed with a value of zero. As in `books._select_entries`,
+    # the unary plus keeps the query on `book_entries_interval`.
+    entries = db.sql(
+        """
+        SELECT
+          book_entries.date_started,
+          book_entries.date_ended,
+          book_entries.skimmed,
+          books.pages
+        FROM
+          book_entries
+        JOIN
+          books
+        ON
+          books.id = book_entries.book
+        WHERE
+          book_entries.date_started <= :end
+        AND
+          book_entries.date_ended >= :start
+        AND
+          NOT book_entries.abandoned
+        ORDER BY
+          +book_entries.id
+        """,
+        values={"start": first_day.isoformat(), "end": last_day.isoformat()},
     )
 
+    totals = {month: 0.0 for month in months}
+    for entry in entries:
+        value = books_service.get_value(entry)
+        days_read = (entry["date_ended"] - entry["date_started"]).days + 1
+        for month in month_range(
+            max(entry["date_started"], first_day), min(entry["date_ended"], last_day)
+        ):
+            month_end = month.replace(day=get_days_in_month(month.year, month.month))
+            n = count_days_of_overlap(
+                month, month_end, entry["date_started"], entry["date_ended"]
+            )
+            totals[month] += value * (n / days_read)
+
+    return [D(totals[month], places=2) for month in months]
+
 
 def metric_films_watched(db: Database, year: int, month: int) -> int:
     n = db.count(
@@ -222,6 +631,8 @@ def metric(
     type,
     start,
     end=None,
+    range_function=None,
+    tables=(),
     suggested_min=None,
     suggested_max=None,
     group=None,
@@ -233,6 +644,10 @@ def metric(
         name=name,
         display_title=display_title,
         function=function,
+        range_function=range_function,
+        # The tables that the metric is computed from, used to detect when cached
+        # values are stale. Metrics with no tables are never cached.
+        tables=tables,
         type=type,
         start=start,
         end=end,
@@ -250,6 +665,7 @@ METRICS = [
         "bookmarks_saved",
         display_title="bookmarks saved",
         function=metric_bookmarks_saved,
+        tables=["bookmarks"],
         group="Productivity",
         type="integer",
         start=datetime.date(2018, 11, 1),
@@ -258,6 +674,8 @@ METRICS = [
         "books_read",
         display_title="books read",
         function=metric_books_read,
+        range_function=range_metric_books_read,
+        tables=["books", "book_entries"],
         group="Productivity",
         type="real",
         start=datetime.date(2014, 1, 1),
@@ -268,6 +686,7 @@ METRICS = [
         "counties_visited",
         display_title="counties visited",
         function=metric_counties_visited,
+        tables=["county_visits"],
         type="integer",
         start=datetime.date(2019, 9, 1),
     ),
@@ -275,6 +694,7 @@ METRICS = [
         "films_watched",
         display_title="films watched",
         function=metric_films_watched,
+        tables=["film_entries"],
         group="Productivity",
         type="integer",
         start=datetime.date(2015, 3, 1),
@@ -285,6 +705,7 @@ METRICS = [
         "habits_bad",
         display_title="bad habits score",
         function=metric_bad_habits,
+        tables=["habit_entries"],
         group="Personal",
         type="integer",
         start=datetime.date(2022, 1, 1),
@@ -293,6 +714,7 @@ METRICS = [
         "habits_good",
         display_title="good habits score",
         function=metric_good_habits,
+        tables=["habit_entries"],
         group="Personal",
         type="integer",
         start=datetime.date(2022, 1, 1),
@@ -301,6 +723,7 @@ METRICS = [
         "journal_entries",
         display_title="journal entries",
         function=metric_journal_entries,
+        tables=["journal_entries"],
         group="Personal",
         type="integer",
         start=datetime.date(2016, 11, 1),
@@ -309,6 +732,7 @@ METRICS = [
         "journal_words",
         display_title="journal words",
         function=metric_journal_words,
+        tables=["journal_entries"],
         group="Personal",
         type="integer",
         start=datetime.date(2016, 11, 1),
@@ -317,6 +741,7 @@ METRICS = [
         "net_income",
         display_title="net income",
         function=metric_net_income,
+        tables=["credits", "debits"],
         group="Finances",
         type="dollar",
         start=datetime.date(2019, 7, 1),
@@ -325,6 +750,7 @@ METRICS = [
         "total_expenses",
         display_title="total expenses",
         function=metric_total_expenses,
+        tables=["credits"],
         group="Finances",
         type="dollar",
         start=datetime.date(2019, 7, 1),
@@ -5,8 +5,17 @@ To migrate the database to match the schema, run ``kgdb migrate base/schema.py``
 will display a list of changes that would be made. To actually make the changes, re-run
 the command with the ``--write`` option.
 
+isqlite does not manage indexes or triggers, so they are declared separately in
+``INDEXES`` and ``TRIGGERS`` and created with ``kgx indexes``. Migrations that rebuild a
+table drop its indexes and triggers, so re-run ``kgx indexes`` after migrating. Code
+whose correctness depends on a trigger also checks for it with ``ensure_triggers`` or
+``get_missing_triggers``.
+
 Further documentation: https://isqlite.readthedocs.io/en/latest/schemas.html
 """
+from typing import List
+
+from base.database import Database
 from isqlite import AutoTable as IsqliteAutoTable
 from isqlite import OnDelete, Schema, columns
 
@@ -15,6 +24,11 @@ def AutoTable(*args, **kwargs):
     return IsqliteAutoTable(*args, use_epoch_timestamps=True, **kwargs)
 
 
+# The types of drill questions. For the list types, the answer is a list of lists of
+# accepted answers; otherwise it is a list of accepted answers.
+QUESTION_TYPES = ("multiple-choice", "unordered-list", "ordered-list", "short-answer")
+
+
 SCHEMA = Schema(
     [
         AutoTable(
@@ -119,6 +133,36 @@ SCHEMA = Schema(
                 columns.time("end", required=False),
             ],
         ),
+        # Occurrences of recurring events, precomputed by the daily task for a rolling
+        # horizon. A recurring event's occurrences are cached for a month if and only if
+        # there is a row for the month in `calendar_occurrence_months`; the triggers in
+        # `TRIGGERS` delete both when the recurring event or an exception changes.
+        AutoTable(
+            "calendar_occurrence_months",
+            columns=[
+                columns.foreign_key(
+                    "recurring_event",
+                    foreign_table="calendar_recurring_events",
+                    on_delete=OnDelete.CASCADE,
+                ),
+                columns.date("month"),
+            ],
+        ),
+        AutoTable(
+            "calendar_occurrences",
+            columns=[
+                columns.foreign_key(
+                    "recurring_event",
+                    foreign_table="calendar_recurring_events",
+                    on_delete=OnDelete.CASCADE,
+                ),
+                columns.date("date"),
+                columns.time("start"),
+                columns.time("end"),
+                # Whether the occurrence was modified by an exception.
+                columns.boolean("modified", default=False),
+            ],
+        ),
         AutoTable(
             "counties",
             columns=[
@@ -282,6 +326,19 @@ SCHEMA = Schema(
                 columns.text("text"),
             ],
         ),
+        # Precomputed metric values, written by the daily task. A row is stale if any
+        # of the metric's source tables has been updated since the row was written, or
+        # if the total number of rows in the source tables has changed (which catches
+        # deletions).
+        AutoTable(
+            "metric_cache",
+            columns=[
+                columns.text("name"),
+                columns.date("month"),
+                columns.decimal("value", required=False),
+                columns.integer("source_rows", required=False),
+            ],
+        ),
         AutoTable(
             "metrics",
             columns=[
@@ -305,15 +362,7 @@ SCHEMA = Schema(
                 columns.text("text"),
                 columns.text("answer"),  # a JSON list
                 columns.text("choices", required=False),  # a JSON list
-                columns.text(
-                    "type",
-                    choices=(
-                        "multiple-choice",
-                        "unordered-list",
-                        "ordered-list",
-                        "short-answer",
-                    ),
-                ),
+                columns.text("type", choices=QUESTION_TYPES),
                 columns.integer("strength", default=0, min=0, max=10),
                 columns.boolean("deprecated", default=False),
                 columns.integer("time_last_asked", default=0),
@@ -327,6 +376,39 @@ SCHEMA = Schema(
                 columns.integer("time_asked"),
             ],
         ),
+        # Aggregates of `quiz_results`, maintained incrementally by `drill.submit_quiz`.
+        AutoTable(
+            "quiz_question_stats",
+            columns=[
+                columns.foreign_key(
+                    "question",
+                    foreign_table="quiz_questions",
+                    on_delete=OnDelete.CASCADE,
+                    unique=True,
+                ),
+                columns.integer("attempts", default=0),
+                columns.integer("total_score", default=0),
+                columns.text("recent_scores"),  # a JSON list, oldest first
+                columns.integer("current_streak", default=0),
+                columns.integer("longest_streak", default=0),
+            ],
+        ),
+        AutoTable(
+            "quiz_stats",
+            columns=[
+                columns.foreign_key(
+                    "quiz",
+                    foreign_table="quizzes",
+                    on_delete=OnDelete.CASCADE,
+                    unique=True,
+                ),
+                columns.integer("attempts", default=0),
+                columns.integer("total_score", default=0),
+                columns.text("recent_scores"),  # a JSON list, oldest first
+                columns.integer("current_streak", default=0),
+                columns.integer("longest_streak", default=0),
+            ],
+        ),
         AutoTable(
             "tasks",
             columns=[
@@ -346,6 +428,9 @@ SCHEMA = Schema(
                 ),
                 columns.integer("priority", required=True, min=0, max=4, default=3),
                 columns.boolean("is_machine_created", default=False),
+                # The latest `last_updated_at` of the task and its comments, time slots,
+                # and updates, maintained by the triggers in `TRIGGERS`.
+                columns.integer("last_updated_at_overall", required=False),
             ],
         ),
         AutoTable(
@@ -381,3 +466,230 @@ SCHEMA = Schema(
         ),
     ]
 )
+
+
+INDEXES = [
+    # For selecting the question pool of a quiz and averaging its strength.
+    """
+    CREATE INDEX IF NOT EXISTS quiz_questions_quiz_deprecated
+    ON quiz_questions(quiz, deprecated)
+    """,
+    # For checking whether a prefetched drill quiz is stale.
+    """
+    CREATE INDEX IF NOT EXISTS quiz_questions_last_updated_at
+    ON quiz_questions(last_updated_at)
+    """,
+    # For fetching the exceptions of the recurring events shown on the calendar.
+    """
+    CREATE INDEX IF NOT EXISTS calendar_recurring_event_exceptions_event_date
+    ON calendar_recurring_event_exceptions(recurring_event, date)
+    """,
+    # For serving calendar occurrences from the cache.
+    """
+    CREATE INDEX IF NOT EXISTS calendar_occurrence_months_event_month
+    ON calendar_occurrence_months(recurring_event, month)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS calendar_occurrences_date
+    ON calendar_occurrences(date)
+    """,
+    # For interval-overlap queries, i.e. `start <= :end AND end >= :start`. SQLite can
+    # range-scan only one bound of an index, so the end date leads: it is the selective
+    # bound for the recent intervals that are usually queried, and the start date is
+    # then checked from the index without reading the table. An open end
+    # (`end IS NULL`) is a second lookup on the same index, as long as the query spells
+    # it out with `OR ... IS NULL`.
+    """
+    CREATE INDEX IF NOT EXISTS calendar_events_interval
+    ON calendar_events(end_date, start_date)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS book_entries_interval
+    ON book_entries(date_ended, date_started)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS county_visits_interval
+    ON county_visits(date_end, date)
+    """,
+    # For fetching the child rows of a page of tasks.
+    """
+    CREATE INDEX IF NOT EXISTS task_comments_task
+    ON task_comments(task, last_updated_at)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS task_time_slots_task
+    ON task_time_slots(task, last_updated_at)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS task_updates_task
+    ON task_updates(task)
+    """,
+    # For listing recently active tasks. The expression must match the one in
+    # `tasks.list_tasks` for the index to be used.
+    """
+    CREATE INDEX IF NOT EXISTS tasks_last_active_at
+    ON tasks(COALESCE(last_updated_at_overall, last_updated_at))
+    """,
+]
+
+
+# Invalidates the cached occurrences of a recurring event when it changes.
+_INVALIDATE_RECURRING_EVENT = """
+    DELETE FROM calendar_occurrence_months WHERE recurring_event = OLD.id;
+    DELETE FROM calendar_occurrences WHERE recurring_event = OLD.id;
+"""
+
+
+# Invalidates the cached occurrences of a recurring event for the month of an exception
+# when the exception changes. `{row}` is either `OLD` or `NEW`.
+_INVALIDATE_EXCEPTION_MONTH = """
+    DELETE FROM calendar_occurrence_months
+    WHERE
+      recurring_event = {row}.recurring_event
+      AND month = DATE({row}.date, 'start of month');
+    DELETE FROM calendar_occurrences
+    WHERE
+      recurring_event = {row}.recurring_event
+      AND date BETWEEN DATE({row}.date, 'start of month')
+      AND DATE({row}.date, 'start of month', '+1 month', '-1 day');
+"""
+
+
+# Recomputes `tasks.last_updated_at_overall` for a task. `{task}` is an expression for
+# the task's ID, e.g. `NEW.task`.
+_REFRESH_TASK_LAST_UPDATED_AT_OVERALL = """
+    UPDATE tasks
+    SET last_updated_at_overall = MAX(
+      last_updated_at,
+      IFNULL((SELECT MAX(last_updated_at) FROM task_comments WHERE task = {task}), 0),
+      IFNULL((SELECT MAX(last_updated_at) FROM task_time_slots WHERE task = {task}), 0),
+      IFNULL((SELECT MAX(last_updated_at) FROM task_updates WHERE task = {task}), 0)
+    )
+    WHERE id = {task};
+"""
+
+
+# The child tables of `tasks` whose timestamps count towards `last_updated_at_overall`.
+_TASK_CHILD_TABLES = ["task_comments", "task_time_slots", "task_updates"]
+
+
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS calendar_recurring_events_update
+    AFTER UPDATE ON calendar_recurring_events
+    BEGIN
+      {_INVALIDATE_RECURRING_EVENT}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS calendar_recurring_events_delete
+    AFTER DELETE ON calendar_recurring_events
+    BEGIN
+      {_INVALIDATE_RECURRING_EVENT}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS calendar_recurring_event_exceptions_insert
+    AFTER INSERT ON calendar_recurring_event_exceptions
+    BEGIN
+      {_INVALIDATE_EXCEPTION_MONTH.format(row="NEW")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS calendar_recurring_event_exceptions_update
+    AFTER UPDATE ON calendar_recurring_event_exceptions
+    BEGIN
+      {_INVALIDATE_EXCEPTION_MONTH.format(row="OLD")}
+      {_INVALIDATE_EXCEPTION_MONTH.format(row="NEW")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS calendar_recurring_event_exceptions_delete
+    AFTER DELETE ON calendar_recurring_event_exceptions
+    BEGIN
+      {_INVALIDATE_EXCEPTION_MONTH.format(row="OLD")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS tasks_insert
+    AFTER INSERT ON tasks
+    BEGIN
+      {_REFRESH_TASK_LAST_UPDATED_AT_OVERALL.format(task="NEW.id")}
+    END
+    """,
+    # The trigger's own update does not set `last_updated_at`, so it does not recurse.
+    f"""
+    CREATE TRIGGER IF NOT EXISTS tasks_update
+    AFTER UPDATE OF last_updated_at ON tasks
+    BEGIN
+      {_REFRESH_TASK_LAST_UPDATED_AT_OVERALL.format(task="NEW.id")}
+    END
+    """,
+    *[
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_insert
+        AFTER INSERT ON {table}
+        BEGIN
+          {_REFRESH_TASK_LAST_UPDATED_AT_OVERALL.format(task="NEW.task")}
+        END
+        """
+        for table in _TASK_CHILD_TABLES
+    ],
+    *[
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_update
+        AFTER UPDATE ON {table}
+        BEGIN
+          {_REFRESH_TASK_LAST_UPDATED_AT_OVERALL.format(task="OLD.task")}
+          {_REFRESH_TASK_LAST_UPDATED_AT_OVERALL.format(task="NEW.task")}
+        END
+        """
+        for table in _TASK_CHILD_TABLES
+    ],
+    *[
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_delete
+        AFTER DELETE ON {table}
+        BEGIN
+          {_REFRESH_TASK_LAST_UPDATED_AT_OVERALL.format(task="OLD.task")}
+        END
+        """
+        for table in _TASK_CHILD_TABLES
+    ],
+]
+
+
+def create_database(path: str) -> None:
+    """
+    Creates a database at ``path`` with the tables in ``SCHEMA``, for scratch databases
+    in tests and simulations. Indexes and triggers are not created.
+    """
+    with Database(path=path, transaction=False) as db:
+        db.migrate(SCHEMA)
+
+
+def get_missing_triggers(db: Database, names: List[str]) -> List[str]:
+    """
+    Returns the names in ``names`` of the triggers that do not exist in the database.
+    """
+    rows = db.sql("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+    existing = {row["name"] for row in rows}
+    return [name for name in names if name not in existing]
+
+
+def ensure_triggers(db: Database, names: List[str]) -> List[str]:
+    """
+    Creates the triggers in ``TRIGGERS`` named in ``names`` that do not exist in the
+    database, and returns the names of those that were created.
+    """
+    missing = get_missing_triggers(db, names)
+    for name in missing:
+        db.sql(_TRIGGERS_BY_NAME[name])
+    return missing
+
+
+# Every statement in `TRIGGERS` starts with `CREATE TRIGGER IF NOT EXISTS <name>`.
+_TRIGGERS_BY_NAME = {
+    statement.split("IF NOT EXISTS", maxsplit=1)[1].split()[0]: statement
+    for statement in TRIGGERS
+}
@@ -1,8 +1,34 @@
-import json
-from typing import List
+import datetime
+from typing import Any, Dict, List, Optional, Tuple
 
+from base import schema
 from base.database import Database, Row
-from base.utils import CustomJSONEncoder
+from base.exceptions import KhaganateError
+from base.schema import SCHEMA
+from base.utils import make_in_condition, parse_date
+
+# The triggers that maintain `tasks.last_updated_at_overall`.
+LAST_UPDATED_AT_OVERALL_TRIGGERS = [
+    "tasks_insert",
+    "tasks_update",
+    "task_comments_insert",
+    "task_comments_update",
+    "task_comments_delete",
+    "task_time_slots_insert",
+    "task_time_slots_update",
+    "task_time_slots_delete",
+    "task_updates_insert",
+    "task_updates_update",
+    "task_updates_delete",
+]
+
+# The time of the last update to a task or its child rows. `last_updated_at_overall` is
+# NULL for tasks that predate the column until it is backfilled.
+_LAST_ACTIVE_AT = "COALESCE(last_updated_at_overall, last_updated_at)"
+
+_TASK_COLUMN_TYPES = {
+    column.name: column.definition.type for column in SCHEMA["tasks"].columns
+}
 
 
 def get_task(db: Database, task_id: int) -> Row:
@@ -16,17 +42,91 @@ def get_task(db: Database, task_id: int) -> Row:
     task["updates"] = db.select(
         "task_updates", where="task = :task", values={"task": task["id"]}
     )
+    _fill_last_updated_at_overall(task)
+    return task
 
-    _set_task_last_updated_at_overall(task)
 
-    return task
+def list_tasks(
+    db: Database,
+    *,
+    statuses: Optional[List[str]] = None,
+    priorities: Optional[List[int]] = None,
+    deadlines: Optional[List[Optional[datetime.date]]] = None,
+    updated_since: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: Optional[int] = None,
+    order: str = "id",
+) -> List[Row]:
+    """
+    Returns tasks with their comments, time slots, and updates, in order of ID, or, if
+    ``order`` is ``"recent"``, from the most to the least recently updated.
+
+    - ``statuses`` and ``priorities`` restrict the tasks to those with one of the given
+      statuses or priorities.
+    - ``deadlines`` restricts the tasks to those with a deadline on or before one of
+      the given dates, or with no deadline at all if the list contains ``None``.
+    - ``updated_since`` restricts the tasks to those whose ``last_updated_at_overall``
+      is at or after the given Unix timestamp.
+    - ``after`` and ``limit`` paginate the tasks: only tasks with an ID greater than
+      ``after`` are returned, at most ``limit`` of them. To fetch the next page, pass
+      the ID of the last task as ``after``.
+
+    The child rows are fetched only for the tasks that are returned.
+    """
+    if order == "id":
+        order_clause = "id"
+    elif order == "recent":
+        if after is not None:
+            raise KhaganateError("after cannot be used when ordering by recent")
+        order_clause = f"{_LAST_ACTIVE_AT} DESC, id DESC"
+    else:
+        raise KhaganateError(f"unknown order {order!r}")
+
+    conditions = []
+    values: Dict[str, Any] = {}
+
+    if statuses is not None:
+        conditions.append(make_in_condition("status", statuses, values))
+
+    if priorities is not None:
+        conditions.append(make_in_condition("priority", priorities, values))
+
+    if deadlines is not None:
+        deadline_conditions = []
+        dates = [deadline for deadline in deadlines if deadline is not None]
+        if dates:
+            deadline_conditions.append("deadline <= :deadline")
+            values["deadline"] = max(dates).isoformat()
+        if None in deadlines:
+            deadline_conditions.append("deadline IS NULL")
+        conditions.append("(" + (" OR ".join(deadline_conditions) or "0") + ")")
+
+    if updated_since is not None:
+        conditions.append(f"{_LAST_ACTIVE_AT} >= :updated_since")
+        values["updated_since"] = updated_since
 
+    if after is not None:
+        conditions.append("id > :after")
+        values["after"] = after
 
-def list_tasks(db: Database) -> List[Row]:
-    tasks = db.select("tasks")
-    comments = db.select("task_comments")
-    time_slots = db.select("task_time_slots")
-    updates = db.select("task_updates")
+    # A negative limit means no limit in SQLite.
+    values["limit"] = limit if limit is not None else -1
+
+    # The page is selected by a subquery that is repeated for the child tables, so that
+    # the child rows of tasks off the page are never read.
+    where = " AND ".join(conditions) or "1"
+    page = f"SELECT id FROM tasks WHERE {where} ORDER BY {order_clause} LIMIT :limit"
+
+    tasks = db.select("tasks", where=f"id IN ({page})", values=values, order_by="id")
+    comments = db.select(
+        "task_comments", where=f"task IN ({page})", values=values, order_by="id"
+    )
+    time_slots = db.select(
+        "task_time_slots", where=f"task IN ({page})", values=values, order_by="id"
+    )
+    updates = db.select(
+        "task_updates", where=f"task IN ({page})", values=values, order_by="id"
+    )
 
     task_map = {}
     for task in tasks:
@@ -34,6 +134,7 @@ def list_tasks(db: Database) -> List[Row]:
         task["time_slots"] = []
         task["updates"] = []
         task["child_tasks"] = []
+        _fill_last_updated_at_overall(task)
         task_map[task["id"]] = task
 
     for comment in comments:
@@ -48,52 +149,188 @@ def list_tasks(db: Database) -> List[Row]:
         task = task_map[update["task"]]
         task["updates"].append(update)
 
-    for task in tasks:
-        _set_task_last_updated_at_overall(task)
+    if order == "recent":
+        tasks.sort(
+            key=lambda task: (task["last_updated_at_overall"], task["id"]), reverse=True
+        )
 
     return tasks
 
 
+def backfill_last_updated_at_overall(db: Database) -> int:
+    """
+    Creates the triggers that maintain ``last_updated_at_overall`` if they do not exist,
+    sets the column for tasks that predate it, and returns the number of tasks that
+    were updated.
+
+    If any trigger was missing, the column is recomputed for every task, since tasks
+    may have been updated while the trigger did not exist.
+    """
+    created = schema.ensure_triggers(db, LAST_UPDATED_AT_OVERALL_TRIGGERS)
+    db.sql(
+        """
+        UPDATE tasks
+        SET last_updated_at_overall = MAX(
+          last_updated_at,
+          IFNULL(
+            (SELECT MAX(last_updated_at) FROM task_comments WHERE task = tasks.id), 0
+          ),
+          IFNULL(
+            (SELECT MAX(last_updated_at) FROM task_time_slots WHERE task = tasks.id), 0
+          ),
+          IFNULL(
+            (SELECT MAX(last_updated_at) FROM task_updates WHERE task = tasks.id), 0
+          )
+        )
+        WHERE last_updated_at_overall IS NULL OR :recompute
+        """,
+        {"recompute": bool(created)},
+    )
+    return db.cursor.rowcount
+
+
 def create_task(db, task: Row) -> Row:
     rowid = db.insert("tasks", task)
     return get_task(db, rowid)
 
 
-def update_task(db: Database, pk: int, updated_task: Row) -> Row:
+def update_task(
+    db: Database, pk: int, updated_task: Row, *, reread: bool = True
+) -> Row:
+    """
+    Updates the task with the fields in ``updated_task`` and records each field whose
+    value changed in ``task_updates``.
+
+    Returns the updated task as returned by ``get_task``, or, if ``reread`` is false,
+    only the task's ID and the fields that changed, which saves re-reading the task and
+    its child rows.
+    """
     task = db.get_by_pk("tasks", pk)
-    # TODO(2021-09-28): This is really janky.
-    serialized_task = json.loads(CustomJSONEncoder().encode(task))
+    changes = _diff_task(task, updated_task)
 
     db.update_by_pk("tasks", pk, updated_task)
-    for key, value in updated_task.items():
-        if serialized_task[key] != value:
-            db.insert(
-                "task_updates",
+    if changes:
+        db.insert_many(
+            "task_updates",
+            [
                 {
                     "task": pk,
-                    "field": key,
-                    "old_value": serialized_task[key] or "",
-                    "new_value": value or "",
-                },
-            )
+                    "field": field,
+                    "old_value": _format_task_value(task[field]) or "",
+                    "new_value": _format_task_value(value) or "",
+                }
+                for field, value in changes.items()
+            ],
+        )
 
-    return get_task(db, pk)
+    if reread:
+        return get_task(db, pk)
+    else:
+        return {"id": pk, **changes}
 
 
-def _set_task_last_updated_at_overall(task: Row) -> None:
-    last_updated_at_overall = task["last_updated_at"]
+def bulk_update_tasks(db: Database, updates: List[Tuple[int, Row]]) -> List[Row]:
+    """
+    Applies a list of ``(pk, changes)`` pairs to tasks, as ``update_task`` would, and
+    returns the task ID and the fields that changed for each task that changed.
 
-    for comment in task["comments"]:
-        last_updated_at_overall = max(
-            last_updated_at_overall, comment["last_updated_at"]
-        )
+    Unlike ``update_task``, tasks for which nothing changed are left untouched, so
+    their ``last_updated_at`` is not bumped. The number of queries does not depend on
+    the number of tasks, except that tasks that change different sets of fields are
+    updated in separate batches.
+    """
+    if not updates:
+        return []
+
+    values: Dict[str, Any] = {}
+    where = make_in_condition("id", [pk for pk, _ in updates], values)
+    task_map = {
+        task["id"]: task for task in db.select("tasks", where=where, values=values)
+    }
+
+    results = []
+    audit_rows = []
+    merged_changes: Dict[int, Dict[str, Any]] = {}
+    for pk, updated_task in updates:
+        task = task_map.get(pk)
+        if task is None:
+            raise KhaganateError(f"task {pk} does not exist")
+
+        changes = _diff_task(task, updated_task)
+        if not changes:
+            continue
+
+        for field, value in changes.items():
+            audit_rows.append(
+                {
+                    "task": pk,
+                    "field": field,
+                    "old_value": _format_task_value(task[field]) or "",
+                    "new_value": _format_task_value(value) or "",
+                }
+            )
+        results.append({"id": pk, **changes})
+        # A later entry for the same task is compared against this one.
+        task.update(changes)
+        merged_changes.setdefault(pk, {}).update(changes)
 
-    for time_slot in task["time_slots"]:
-        last_updated_at_overall = max(
-            last_updated_at_overall, time_slot["last_updated_at"]
+    # Tasks that change the same fields are updated with a single `executemany`.
+    batches: Dict[Tuple[str, ...], List[Tuple[Any, ...]]] = {}
+    for pk, changes in merged_changes.items():
+        batches.setdefault(tuple(changes), []).append(tuple(changes.values()) + (pk,))
+
+    # isqlite has no batched update, so the statements are executed directly. They set
+    # `last_updated_at` themselves since they bypass `Database.update`.
+    for fields, rows in batches.items():
+        assignments = "".join(f"{field} = ?, " for field in fields)
+        db.cursor.executemany(
+            f"""
+            UPDATE
+              tasks
+            SET
+              {assignments}last_updated_at = STRFTIME('%s', 'now')
+            WHERE
+              id = ?
+            """,
+            rows,
         )
 
-    task["last_updated_at_overall"] = last_updated_at_overall
+    if audit_rows:
+        db.insert_many("task_updates", audit_rows)
+
+    return results
+
+
+def _diff_task(task: Row, updated_task: Row) -> Dict[str, Any]:
+    """
+    Returns the fields of ``updated_task`` whose values differ from ``task``, as a map
+    from field to new value.
+
+    ``updated_task`` usually comes from a JSON payload, so its values are converted to
+    the types of the task's columns (i.e., dates are parsed) before they are compared.
+    Raises ``KhaganateError`` if ``updated_task`` has a field that tasks do not have.
+    """
+    changes = {}
+    for field, value in updated_task.items():
+        if field not in _TASK_COLUMN_TYPES:
+            raise KhaganateError(f"tasks have no field {field!r}")
+
+        if isinstance(value, str) and value and _TASK_COLUMN_TYPES[field] == "DATE":
+            value = parse_date(value)
+
+        if task[field] != value:
+            changes[field] = value
+    return changes
+
+
+def _format_task_value(value: Any) -> Any:
+    # Dates are recorded in `task_updates` in ISO format, as they appear in JSON.
+    return value.isoformat() if isinstance(value, datetime.date) else value
+
+
+def _fill_last_updated_at_overall(task: Row) -> None:
+    if task["last_updated_at_overall"] is None:
+        task["last_updated_at_overall"] = task["last_updated_at"]
 
 
 def _simplified_task(task: Row) -> Row:
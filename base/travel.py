@@ -6,26 +6,25 @@ from base.utils import parse_date
 
 
 def list_visits(db: Database, year: Optional[int] = None) -> List[Dict[str, Any]]:
+    # The visits are fetched in one query and grouped by county here, rather than
+    # queried county by county, so that the year filter is a single range scan of
+    # `county_visits_interval`.
+    if year:
+        visits = db.select(
+            "county_visits",
+            where="date <= :year_end AND (date_end >= :year_start OR date_end IS NULL)",
+            values={"year_start": f"{year}-01-01", "year_end": f"{year}-12-31"},
+        )
+    else:
+        visits = db.select("county_visits")
+
+    visits_by_county: Dict[int, List[Row]] = {}
+    for visit in visits:
+        visits_by_county.setdefault(visit["county"], []).append(visit)
+
     counties = []
     for county in db.select("counties"):
-        if year:
-            visits = db.select(
-                "county_visits",
-                where="county = :county AND date <= :year_end AND "
-                + "(date_end >= :year_start OR date_end IS NULL)",
-                values={
-                    "county": county["id"],
-                    "year_start": f"{year}-01-01",
-                    "year_end": f"{year}-12-31",
-                },
-            )
-        else:
-            visits = db.select(
-                "county_visits",
-                where="county = :county",
-                values={"county": county["id"]},
-            )
-
+        visits = visits_by_county.get(county["id"])
         if not visits:
             continue
 
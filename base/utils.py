@@ -3,7 +3,7 @@ import datetime
 import decimal
 import re
 from django.core.serializers.json import DjangoJSONEncoder
-from typing import Iterator, Optional
+from typing import Any, Dict, Iterable, Iterator, Optional
 
 from base import constants
 
@@ -314,6 +314,21 @@ def date_range(start: datetime.date, end: datetime.date) -> Iterator[datetime.da
         it += datetime.timedelta(days=1)
 
 
+def month_range(start: datetime.date, end: datetime.date) -> Iterator[datetime.date]:
+    """
+    Yields the first day of each month in the inclusive range from ``start`` to ``end``.
+
+    The ``day`` fields of ``start`` and ``end`` are ignored.
+    """
+    it = datetime.date(start.year, start.month, 1)
+    while it <= end:
+        yield it
+        if it.month < 12:
+            it = datetime.date(it.year, it.month + 1, 1)
+        else:
+            it = datetime.date(it.year + 1, 1, 1)
+
+
 MONTHS_TO_INDICES = {
     "january": 1,
     "february": 2,
@@ -336,3 +351,23 @@ class CustomJSONEncoder(DjangoJSONEncoder):
             return float(o)
 
         return super().default(o)
+
+
+def make_in_condition(column: str, xs: Iterable[Any], values: Dict[str, Any]) -> str:
+    """
+    Returns a SQL condition that ``column`` is one of ``xs``, and adds a placeholder
+    value to ``values`` for each element of ``xs``.
+
+    The condition is always false if ``xs`` is empty, since ``IN ()`` is not valid SQL.
+    """
+    prefix = re.sub(r"\W", "_", column)
+    placeholders = []
+    for i, x in enumerate(xs):
+        key = f"{prefix}{i}"
+        values[key] = x
+        placeholders.append(f":{key}")
+
+    if not placeholders:
+        return "0"
+
+    return f"{column} IN ({', '.join(placeholders)})"
@@ -4,8 +4,23 @@ export async function getTask(id) {
   return await apiService.get("/api/tasks/get/" + id);
 }
 
-export async function getTasks() {
-  return await apiService.get("/api/tasks/list");
+// `filters` maps query parameters of `/api/tasks/list` (e.g., `status`) to lists of
+// values.
+export async function getTasks(filters = {}) {
+  const params = new URLSearchParams();
+  for (const [key, values] of Object.entries(filters)) {
+    for (const value of values) {
+      params.append(key, value);
+    }
+  }
+  const query = params.toString();
+  return await apiService.get("/api/tasks/list" + (query ? "?" + query : ""));
+}
+
+// `updates` is a list of `{ id, changes }` objects. Returns the ID and the changed
+// fields of each task that changed.
+export async function bulkUpdateTasks(updates) {
+  return await apiService.post("/api/tasks/bulk-update", { updates });
 }
 
 export async function createTask(task) {
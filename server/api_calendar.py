@@ -0,0 +1,22 @@
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from typing import Iterator
+
+from base import icalendar
+from base.database import Database
+
+
+@require_GET
+def export_ics(request: HttpRequest) -> HttpResponse:
+    response = StreamingHttpResponse(
+        _stream_calendar(), content_type="text/calendar; charset=utf-8"
+    )
+    response["Content-Disposition"] = 'attachment; filename="khaganate.ics"'
+    return response
+
+
+def _stream_calendar() -> Iterator[str]:
+    # The database is opened inside the generator so that it stays open while Django
+    # streams the response, which happens after the view has returned.
+    with Database(readonly=True) as db:
+        yield from icalendar.export_calendar(db)
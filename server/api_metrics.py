@@ -0,0 +1,30 @@
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
+
+from base import metrics
+from base.database import Database
+from base.utils import CustomJSONEncoder
+
+
+@require_GET
+def analytics(request: HttpRequest, metric_name: str) -> HttpResponse:
+    """
+    Returns ``metrics.get_metric_analytics`` for the metric, with the size of the
+    rolling window taken from the optional ``window`` query parameter.
+    """
+    window = request.GET.get("window")
+    if not window:
+        window_size = metrics.DEFAULT_ANALYTICS_WINDOW
+    elif window.isdigit() and int(window) >= 1:
+        window_size = int(window)
+    else:
+        return JsonResponse(
+            {"error": f"window must be a positive integer, not {window!r}"}, status=400
+        )
+
+    with Database(readonly=True) as db:
+        return JsonResponse(
+            metrics.get_metric_analytics(db, metric_name, window_size),
+            encoder=CustomJSONEncoder,
+            safe=False,
+        )
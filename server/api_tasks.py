@@ -0,0 +1,103 @@
+import datetime
+import json
+import sqlite3
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET, require_POST
+from typing import List, Optional, Tuple
+
+from base import tasks
+from base.database import Database, Row
+from base.exceptions import KhaganateError
+from base.utils import CustomJSONEncoder, snake_case
+
+
+@require_GET
+def list_tasks(request: HttpRequest) -> HttpResponse:
+    """
+    Lists tasks, filtered and paginated by the query parameters:
+
+    - ``status`` and ``priority``, which may be repeated.
+    - ``deadline``, which may be repeated, as an ISO date or ``none``.
+    - ``updated_since``, as a Unix timestamp.
+    - ``after`` and ``limit``, for keyset pagination by task ID.
+    - ``order``, either ``id`` (the default) or ``recent``.
+
+    See ``tasks.list_tasks`` for their meaning.
+    """
+    try:
+        kwargs = {
+            "statuses": request.GET.getlist("status") or None,
+            "priorities": [int(p) for p in request.GET.getlist("priority")] or None,
+            "deadlines": [
+                None if d == "none" else datetime.date.fromisoformat(d)
+                for d in request.GET.getlist("deadline")
+            ]
+            or None,
+            "updated_since": _get_int(request, "updated_since"),
+            "after": _get_int(request, "after"),
+            "limit": _get_int(request, "limit"),
+            "order": request.GET.get("order", "id"),
+        }
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    try:
+        with Database(readonly=True) as db:
+            result = tasks.list_tasks(db, **kwargs)
+    except KhaganateError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse(result, encoder=CustomJSONEncoder, safe=False)
+
+
+@require_POST
+def bulk_update(request: HttpRequest) -> HttpResponse:
+    """
+    Applies a list of task updates in one transaction. The body of the request is a
+    JSON object whose ``updates`` field is a list of ``{"id": pk, "changes": {...}}``
+    objects. Returns the ID and the changed fields of each task that changed.
+    """
+    try:
+        updates = _parse_bulk_updates(request.body)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    # Nothing is written if any update fails, since the transaction is rolled back. A
+    # value that violates a constraint of the `tasks` table, e.g. a priority out of
+    # range, raises an `IntegrityError`.
+    try:
+        with Database() as db:
+            changed = tasks.bulk_update_tasks(db, updates)
+    except (KhaganateError, ValueError, sqlite3.IntegrityError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse(changed, encoder=CustomJSONEncoder, safe=False)
+
+
+def _parse_bulk_updates(body: bytes) -> List[Tuple[int, Row]]:
+    """
+    Parses the body of a bulk update request into ``(pk, changes)`` pairs, raising
+    ``ValueError`` if it is malformed.
+    """
+    payload = json.loads(body)
+    updates = payload.get("updates") if isinstance(payload, dict) else None
+    if not isinstance(updates, list):
+        raise ValueError("the body must be an object with an updates list")
+
+    result = []
+    for update in updates:
+        if not (
+            isinstance(update, dict)
+            and isinstance(update.get("id"), int)
+            and isinstance(update.get("changes"), dict)
+        ):
+            raise ValueError("each update must be an object with an id and changes")
+
+        changes = {snake_case(key): value for key, value in update["changes"].items()}
+        result.append((update["id"], changes))
+    return result
+
+
+def _get_int(request: HttpRequest, key: str) -> Optional[int]:
+    value = request.GET.get(key)
+    return int(value) if value is not None else None
@@ -18,12 +18,15 @@ from base import (
 from . import (
     api_alerts,
     api_bookmarks,
+    api_calendar,
     api_database,
     api_explorer,
     api_finances,
     api_golinks,
     api_journal,
+    api_metrics,
     api_tags,
+    api_tasks,
     converters,
     views,
 )
@@ -48,6 +51,7 @@ urlpatterns = [
     path("api/books/list/<int:year>", adapt(books.list_books)),
     path("api/books/list/<int:year>/<int:month>", adapt(books.list_books)),
     path("api/books/start", adapt(books.start_book, post=True)),
+    path("api/books/stats", adapt(books.get_reading_stats)),
     path(
         "api/books/recommendations/start/<int:pk>",
         adapt(books.start_recommendation, post=True),
@@ -72,6 +76,8 @@ urlpatterns = [
     ),
     # Drill APIs
     path("api/drill/get", adapt(drill.get_quiz)),
+    path("api/drill/stats", adapt(drill.get_stats)),
+    path("api/drill/stats/<int:quiz_pk>", adapt(drill.get_quiz_stats)),
     path("api/drill/submit", adapt(drill.submit_quiz, post=True)),
     # Films APIs
     path("api/films/watch", adapt(films.watch_film, post=True)),
@@ -80,14 +86,16 @@ urlpatterns = [
     # Goals APIs
     path("api/goals/list/<int:year>/<int:month>", adapt(goals.list_current)),
     # Metrics APIs
+    path("api/metrics/analytics/<metric_name>", api_metrics.analytics),
     path("api/metrics/get/<metric_name>", adapt(metrics.get_metric)),
     path("api/metrics/list/<int:year>/<int:month>", adapt(metrics.list_metrics)),
     # Search APIs
     path("api/search", adapt(search.search, query_parameter="q")),
     # Tasks APIs
+    path("api/tasks/bulk-update", api_tasks.bulk_update),
     path("api/tasks/create", adapt(tasks.create_task, post=True)),
     path("api/tasks/get/<int:task_id>", adapt(tasks.get_task)),
-    path("api/tasks/list", adapt(tasks.list_tasks)),
+    path("api/tasks/list", api_tasks.list_tasks),
     path("api/tasks/update/<int:pk>", adapt(tasks.update_task, post=True)),
     # Travel APIs
     path("api/travel/list", adapt(travel.list_visits)),
@@ -95,6 +103,7 @@ urlpatterns = [
     path("api/travel/create", adapt(travel.create_visit, post=True)),
     # Specialized APIs
     path("api/alerts/list", api_alerts.list),
+    path("api/calendar/export.ics", api_calendar.export_ics),
     path("api/files/get/", api_explorer.files_get),
     path("api/files/get/<path:path>", api_explorer.files_get),
     path("api/files/raw/<path:path>", api_explorer.files_get_raw),
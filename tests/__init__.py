@@ -0,0 +1,29 @@
+import contextlib
+import os
+import tempfile
+from typing import Iterator
+
+from base import schema
+from base.database import Database
+
+
+@contextlib.contextmanager
+def scratch_database_path() -> Iterator[str]:
+    """
+    Yields the path to a freshly migrated database in a temporary directory, which is
+    deleted afterwards. Useful for tests that need more than one transaction.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "test.sqlite3")
+        schema.create_database(path)
+        yield path
+
+
+@contextlib.contextmanager
+def scratch_database() -> Iterator[Database]:
+    """
+    Yields a connection to a database created by ``scratch_database_path``.
+    """
+    with scratch_database_path() as path:
+        with Database(path=path) as db:
+            yield db
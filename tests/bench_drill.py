@@ -0,0 +1,50 @@
+"""
+A microbenchmark for the weighted sampling used to select drill questions.
+
+Run it with ``python -m tests.bench_drill``. It is not collected by the test runner.
+"""
+import random
+import timeit
+from typing import List
+
+from base.drill import make_weighted_choice
+
+
+def make_weighted_choice_naive(choices: list, weights: List[float], count: int) -> list:
+    # The original implementation, kept for comparison. Based on
+    # https://stackoverflow.com/a/3679747/
+    selected: list = []
+
+    while len(selected) < count:
+        total = sum(weights)
+        r = random.uniform(0, total)
+        upto = 0.0
+        for i, (choice, weight) in enumerate(zip(choices, weights)):
+            if upto + weight >= r:
+                selected.append(choice)
+                choices = choices[:i] + choices[i + 1 :]
+                weights = weights[:i] + weights[i + 1 :]
+                break
+
+            upto += weight
+
+    return selected
+
+
+def main() -> None:
+    for pool_size in (100, 1000, 10000, 50000):
+        choices = list(range(pool_size))
+        weights = [random.random() for _ in choices]
+        for name, f in (
+            ("naive", make_weighted_choice_naive),
+            ("exponential keys", make_weighted_choice),
+        ):
+            number = max(1, 100000 // pool_size)
+            seconds = timeit.timeit(lambda: f(choices, weights, 20), number=number)
+            print(
+                f"pool={pool_size:<6} {name:<17} {seconds / number * 1000:8.3f} ms/call"
+            )
+
+
+if __name__ == "__main__":
+    main()
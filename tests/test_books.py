@@ -0,0 +1,74 @@
+import datetime
+import unittest
+
+from base import books
+from base.database import Database
+from tests import scratch_database_path
+
+
+class BooksTests(unittest.TestCase):
+    def test_reading_stats_cache(self):
+        with scratch_database_path() as path:
+            with Database(path=path) as db:
+                book = db.insert(
+                    "books",
+                    {"title": "T", "authors": "A", "fictional": True, "pages": 300},
+                )
+                entry = db.insert(
+                    "book_entries",
+                    {
+                        "book": book,
+                        "date_started": datetime.date(2022, 1, 20),
+                        "abandoned": False,
+                    },
+                )
+                _backdate_book_tables(db)
+
+                stats = books.get_reading_stats(db)
+                self.assertEqual(stats["total"]["books"], 0)
+                self.assertIs(books.get_reading_stats(db), stats)
+
+            with Database(path=path) as db:
+                books.finish_book(
+                    db,
+                    entry,
+                    {
+                        "pages": None,
+                        "date_ended": datetime.date(2022, 2, 10),
+                        "abandoned": False,
+                    },
+                )
+                # With the timestamps backdated, the fingerprint of the book tables is
+                # unchanged, so only the invalidation on commit makes the cache stale.
+                _backdate_book_tables(db)
+                self.assertIs(books.get_reading_stats(db), stats)
+
+            with Database(path=path) as db:
+                stats = books.get_reading_stats(db)
+                self.assertEqual(stats["total"]["books"], 1)
+                self.assertEqual(stats["total"]["fiction"], 1)
+                self.assertEqual(
+                    [(month["month"], month["books"]) for month in stats["months"]],
+                    [(1, 0), (2, 1)],
+                )
+                self.assertIs(books.get_reading_stats(db), stats)
+
+                # Changes made through the generic database API are caught by the
+                # fingerprint.
+                db.insert(
+                    "book_entries",
+                    {
+                        "book": book,
+                        "date_started": datetime.date(2022, 3, 1),
+                        "date_ended": datetime.date(2022, 3, 5),
+                        "abandoned": False,
+                    },
+                )
+                _backdate_book_tables(db)
+                stats = books.get_reading_stats(db)
+                self.assertEqual(stats["total"]["books"], 2)
+
+
+def _backdate_book_tables(db: Database) -> None:
+    db.sql("UPDATE books SET last_updated_at = 1")
+    db.sql("UPDATE book_entries SET last_updated_at = 1")
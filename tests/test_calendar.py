@@ -0,0 +1,122 @@
+import unittest
+from datetime import date, time
+from typing import List
+
+from base import schema
+from base.calendar import (
+    OCCURRENCE_CACHE_TRIGGERS,
+    get_occurrences,
+    get_recurring_events,
+    refresh_occurrence_cache,
+)
+from base.database import Database
+from base.utils import get_days_in_month
+from tests import scratch_database
+
+
+def recurring_event(recurrence, recurrence_start, recurrence_end=None):
+    return {
+        "recurrence": recurrence,
+        "recurrence_start": recurrence_start,
+        "recurrence_end": recurrence_end,
+    }
+
+
+class CalendarTests(unittest.TestCase):
+    def test_get_occurrences_weekdays(self):
+        # 2022-05-14 is a Saturday.
+        event = recurring_event("weekdays", date(2022, 1, 1))
+        self.assertEqual(
+            list(get_occurrences(event, date(2022, 5, 14), date(2022, 5, 23))),
+            [
+                date(2022, 5, 16),
+                date(2022, 5, 17),
+                date(2022, 5, 18),
+                date(2022, 5, 19),
+                date(2022, 5, 20),
+                date(2022, 5, 23),
+            ],
+        )
+
+    def test_get_occurrences_weekly(self):
+        # 2022-05-04 is a Wednesday.
+        event = recurring_event("weekly", date(2022, 5, 4), date(2022, 5, 25))
+        self.assertEqual(
+            list(get_occurrences(event, date(2022, 5, 1), date(2022, 5, 31))),
+            [date(2022, 5, 4), date(2022, 5, 11), date(2022, 5, 18), date(2022, 5, 25)],
+        )
+        self.assertEqual(
+            list(get_occurrences(event, date(2022, 5, 12), date(2022, 5, 17))), []
+        )
+
+    def test_get_occurrences_yearly(self):
+        event = recurring_event("yearly", date(2020, 2, 29))
+        self.assertEqual(
+            list(get_occurrences(event, date(2019, 1, 1), date(2024, 12, 31))),
+            [date(2020, 2, 29), date(2024, 2, 29)],
+        )
+
+        event = recurring_event("yearly", date(2020, 7, 4))
+        self.assertEqual(
+            list(get_occurrences(event, date(2021, 7, 5), date(2023, 7, 4))),
+            [date(2022, 7, 4), date(2023, 7, 4)],
+        )
+
+    def test_occurrence_cache_is_invalidated(self):
+        with scratch_database() as db:
+            pk = db.insert(
+                "calendar_recurring_events",
+                {
+                    "start": time(9, 0),
+                    "end": time(10, 0),
+                    "title": "Standup",
+                    "recurrence": "weekdays",
+                    "recurrence_start": date(2022, 1, 1),
+                },
+            )
+
+            # The triggers are created on the first refresh if they are missing.
+            self.assertGreater(refresh_occurrence_cache(db, date(2022, 5, 14)), 0)
+            self.assertEqual(
+                schema.get_missing_triggers(db, OCCURRENCE_CACHE_TRIGGERS), []
+            )
+            self.assertTrue(_is_month_cached(db, pk, date(2022, 5, 1)))
+
+            db.insert(
+                "calendar_recurring_event_exceptions",
+                {"recurring_event": pk, "date": date(2022, 5, 16)},
+            )
+            self.assertFalse(_is_month_cached(db, pk, date(2022, 5, 1)))
+            self.assertTrue(_is_month_cached(db, pk, date(2022, 6, 1)))
+            self.assertNotIn(date(2022, 5, 16), _get_dates(db, date(2022, 5, 1)))
+
+            # Without the triggers, the stale cache is not used, and the next
+            # refresh recreates them and drops the cache.
+            refresh_occurrence_cache(db, date(2022, 5, 14))
+            self.assertTrue(_is_month_cached(db, pk, date(2022, 5, 1)))
+            db.sql("DROP TRIGGER calendar_recurring_event_exceptions_delete")
+            db.delete("calendar_recurring_event_exceptions", where="1")
+            self.assertTrue(_is_month_cached(db, pk, date(2022, 5, 1)))
+            self.assertIn(date(2022, 5, 16), _get_dates(db, date(2022, 5, 1)))
+
+            refresh_occurrence_cache(db, date(2022, 5, 14))
+            self.assertEqual(
+                schema.get_missing_triggers(db, OCCURRENCE_CACHE_TRIGGERS), []
+            )
+            self.assertIn(date(2022, 5, 16), _get_dates(db, date(2022, 5, 1)))
+
+
+def _is_month_cached(db: Database, pk: int, month: date) -> bool:
+    return (
+        db.get(
+            "calendar_occurrence_months",
+            where="recurring_event = :pk AND month = :month",
+            values={"pk": pk, "month": month},
+        )
+        is not None
+    )
+
+
+def _get_dates(db: Database, month: date) -> List[date]:
+    end = month.replace(day=get_days_in_month(month.year, month.month))
+    return [event["start_date"] for event in get_recurring_events(db, month, end)]
@@ -1,6 +1,28 @@
+import json
+import random
 import unittest
+from collections import Counter
+from typing import List
 
-from base.drill import parse_question, score_question
+from base.database import Database, Row
+from base.drill import (
+    STATS_COLUMNS,
+    DrillParseError,
+    compile_answer,
+    format_question,
+    get_question_weights,
+    get_quiz_stats,
+    get_stats,
+    make_weighted_choice,
+    normalize_answer,
+    parse_question,
+    parse_questions,
+    parse_questions_jsonl,
+    rebuild_stats,
+    score_question,
+    submit_quiz,
+)
+from tests import scratch_database
 
 TEST_QUESTIONS = [
     [line.strip() for line in question.strip().splitlines()]
@@ -84,6 +106,64 @@ class DrillTests(unittest.TestCase):
             },
         )
 
+    def test_parse_questions(self):
+        lines = []
+        for question in TEST_QUESTIONS:
+            lines.extend(line + "\n" for line in question)
+            lines.append("\n")
+
+        self.assertEqual(
+            list(parse_questions("test", lines)),
+            [parse_question("test", question, 1) for question in TEST_QUESTIONS],
+        )
+
+        with self.assertRaisesRegex(DrillParseError, "line 4"):
+            list(parse_questions("test", ["[1] a", "b", "", "c", "d"]))
+
+    def test_format_question(self):
+        for lines in TEST_QUESTIONS:
+            question = parse_question("test", lines, 1)
+            del question["id"]
+            question.pop("tags", None)
+            self.assertEqual(
+                parse_question("test", format_question(question), 1),
+                {**question, "id": "test-1"},
+            )
+
+    def test_parse_questions_jsonl(self):
+        lines = [
+            '{"text": "a", "answer": ["b"], "choices": null, "type": "short-answer"}',
+            "",
+        ]
+        self.assertEqual(
+            list(parse_questions_jsonl(lines)),
+            [{"text": "a", "answer": ["b"], "choices": None, "type": "short-answer"}],
+        )
+
+        with self.assertRaisesRegex(DrillParseError, "line 2"):
+            list(parse_questions_jsonl(["", '{"text": "a"}']))
+
+        with self.assertRaisesRegex(DrillParseError, "list of strings, line 1"):
+            list(
+                parse_questions_jsonl(
+                    ['{"text": "a", "answer": "Paris", "type": "short-answer"}']
+                )
+            )
+
+        with self.assertRaisesRegex(DrillParseError, "lists of strings, line 1"):
+            list(
+                parse_questions_jsonl(
+                    ['{"text": "a", "answer": ["b", "c"], "type": "ordered-list"}']
+                )
+            )
+
+        with self.assertRaisesRegex(DrillParseError, "question type 'essay', line 1"):
+            list(
+                parse_questions_jsonl(
+                    ['{"text": "a", "answer": ["b"], "type": "essay"}']
+                )
+            )
+
     def test_score_unordered_list_question(self):
         self.assertEqual(
             score_question(
@@ -168,3 +248,150 @@ class DrillTests(unittest.TestCase):
             ),
             0,
         )
+
+    def test_score_question_lenient(self):
+        question = {
+            "type": "short-answer",
+            "answer": ["São Paulo"],
+        }
+
+        self.assertEqual(score_question(question, ["sao paulo"], lenient=False), 0)
+        self.assertEqual(score_question(question, ["sao paulo"], lenient=True), 100)
+        self.assertEqual(score_question(question, ["São  Paulo!"], lenient=True), 100)
+
+    def test_score_list_question_with_missing_responses(self):
+        question = {
+            "type": "ordered-list",
+            "answer": [["Fred Astaire"], ["Ginger Rogers"]],
+        }
+
+        self.assertEqual(score_question(question, ["Fred Astaire", None]), 50)
+
+    def test_compile_answer(self):
+        self.assertEqual(
+            compile_answer(
+                {"type": "unordered-list", "answer": [["Fred Astaire", "Astaire"]]},
+                lenient=False,
+            ),
+            (frozenset(["fred astaire", "astaire"]),),
+        )
+        self.assertEqual(
+            compile_answer(
+                {"type": "short-answer", "answer": ["United Kingdom", "UK"]},
+                lenient=False,
+            ),
+            (frozenset(["united kingdom", "uk"]),),
+        )
+
+    def test_normalize_answer(self):
+        self.assertEqual(normalize_answer("Straße"), "strasse")
+        self.assertEqual(normalize_answer("Don't Panic"), "don't panic")
+        self.assertEqual(
+            normalize_answer("  Don't   Pánic ", lenient=True), "dont panic"
+        )
+
+    def test_make_weighted_choice_distribution(self):
+        # Compare the empirical distribution of the first and second selections to the
+        # exact probabilities of drawing one item at a time in proportion to weight.
+        choices = ["a", "b", "c", "d"]
+        weights = [1.0, 2.0, 3.0, 4.0]
+        total = sum(weights)
+        trials = 20000
+
+        random.seed(1)
+        first: Counter = Counter()
+        second: Counter = Counter()
+        for _ in range(trials):
+            selected = make_weighted_choice(choices, weights, 2)
+            self.assertEqual(len(set(selected)), 2)
+            first[selected[0]] += 1
+            second[selected[1]] += 1
+
+        for j, choice in enumerate(choices):
+            p_first = weights[j] / total
+            p_second = sum(
+                (weights[i] / total) * (weights[j] / (total - weights[i]))
+                for i in range(len(choices))
+                if i != j
+            )
+            self.assertAlmostEqual(first[choice] / trials, p_first, delta=0.015)
+            self.assertAlmostEqual(second[choice] / trials, p_second, delta=0.015)
+
+    def test_make_weighted_choice_edge_cases(self):
+        self.assertEqual(
+            sorted(make_weighted_choice(["a", "b", "c"], [0.0, 0.0, 0.5], 3)),
+            ["a", "b", "c"],
+        )
+        self.assertEqual(make_weighted_choice(["a", "b"], [0.0, 0.5], 1), ["b"])
+
+        with self.assertRaises(ValueError):
+            make_weighted_choice(["a", "b"], [0.5, 0.5], 3)
+
+    def test_get_question_weights(self):
+        weights = get_question_weights([100, 200, 300], [0, 3, 10])
+        self.assertEqual(weights, [0.8 * 1.0 + 0.2, 0.8 * 0.5 + 0.1, 0.8 * 0.05])
+
+        with self.assertRaises(KeyError):
+            get_question_weights([100], [7])
+
+    def test_incremental_stats_match_rebuild(self):
+        with scratch_database() as db:
+            for quiz in ["Quiz A", "Quiz B"]:
+                quiz_pk = db.insert("quizzes", {"name": quiz})
+                for i in range(3):
+                    db.insert(
+                        "quiz_questions",
+                        {
+                            "quiz": quiz_pk,
+                            "text": f"Question {i}",
+                            "answer": json.dumps([f"answer {i}"]),
+                            "type": "short-answer",
+                        },
+                    )
+
+            # Enough submissions to overflow `recent_scores` and to break and restart
+            # streaks, with some questions answered twice in the same submission.
+            for n in range(12):
+                questions = db.select("quiz_questions", order_by="id")
+                questions = questions[n % 3 :] + questions[: 1 + n % 2]
+                responses = []
+                for i, row in enumerate(questions):
+                    # `submit_quiz` expects the question as returned by `get_quiz`.
+                    question = {
+                        **row,
+                        "quiz": {"id": row["quiz"]},
+                        "answer": json.loads(row["answer"]),
+                    }
+                    answer = question["answer"][0] if (n + i) % 4 else "wrong"
+                    responses.append(
+                        {"question": question, "response": {"response": [answer]}}
+                    )
+                submit_quiz(db, {"responses": responses}, now=n, prefetch=False)
+
+            quiz_pks = [quiz["id"] for quiz in db.select("quizzes")]
+            incremental = (
+                _get_stats_rows(db, "quiz_question_stats", "question"),
+                _get_stats_rows(db, "quiz_stats", "quiz"),
+                get_stats(db),
+                [get_quiz_stats(db, pk) for pk in quiz_pks],
+            )
+            self.assertEqual(len(incremental[0]), 6)
+            self.assertTrue(
+                any(
+                    len(json.loads(row["recent_scores"])) == 10
+                    for row in incremental[1]
+                )
+            )
+
+            rebuild_stats(db)
+            rebuilt = (
+                _get_stats_rows(db, "quiz_question_stats", "question"),
+                _get_stats_rows(db, "quiz_stats", "quiz"),
+                get_stats(db),
+                [get_quiz_stats(db, pk) for pk in quiz_pks],
+            )
+            self.assertEqual(incremental, rebuilt)
+
+
+def _get_stats_rows(db: Database, table: str, column: str) -> List[Row]:
+    return db.select(table, columns=[column, *STATS_COLUMNS], order_by=column)
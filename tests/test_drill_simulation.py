@@ -0,0 +1,42 @@
+import random
+import unittest
+
+from base.drill_simulation import simulate
+
+
+class DrillSimulationTests(unittest.TestCase):
+    def test_simulate(self):
+        quizzes = 5
+        questions_per_quiz = 10
+        days = 3
+        report = simulate(
+            quizzes=quizzes, questions_per_quiz=questions_per_quiz, days=days
+        )
+
+        self.assertEqual(len(report["strengths"]), days + 1)
+        self.assertEqual(report["strengths"][0], {0: quizzes * questions_per_quiz})
+        for distribution in report["strengths"]:
+            self.assertEqual(sum(distribution.values()), quizzes * questions_per_quiz)
+        self.assertNotEqual(report["strengths"][-1], report["strengths"][0])
+
+        self.assertGreater(report["selection_seconds"]["max"], 0)
+        self.assertGreater(report["selection_statements"], 0)
+        self.assertGreater(report["submission_statements"], 0)
+
+    def test_simulate_is_deterministic(self):
+        self.assertEqual(
+            simulate(days=2, seed=1)["strengths"], simulate(days=2, seed=1)["strengths"]
+        )
+
+    def test_simulate_restores_random_state(self):
+        random.seed(42)
+        state = random.getstate()
+        simulate(days=1)
+        self.assertEqual(random.getstate(), state)
+
+    def test_simulate_requires_enough_questions(self):
+        with self.assertRaises(ValueError):
+            simulate(quizzes=2)
+
+        with self.assertRaises(ValueError):
+            simulate(questions_per_quiz=9)
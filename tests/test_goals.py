@@ -1,7 +1,7 @@
 import unittest
 from datetime import date
 
-from base.goals import get_start_of_quarter
+from base.goals import get_month_range_for_goal, get_start_of_quarter
 
 
 class GoalsTests(unittest.TestCase):
@@ -21,3 +21,18 @@ class GoalsTests(unittest.TestCase):
         self.assertEqual(get_start_of_quarter(date(2022, 10, 1)), date(2022, 10, 1))
         self.assertEqual(get_start_of_quarter(date(2022, 11, 1)), date(2022, 10, 1))
         self.assertEqual(get_start_of_quarter(date(2022, 12, 1)), date(2022, 10, 1))
+
+    def test_get_month_range_for_goal(self):
+        today = date(2022, 5, 17)
+        self.assertEqual(
+            get_month_range_for_goal(today, "month"),
+            (date(2022, 5, 1), date(2022, 5, 1)),
+        )
+        self.assertEqual(
+            get_month_range_for_goal(today, "quarter"),
+            (date(2022, 4, 1), date(2022, 5, 1)),
+        )
+        self.assertEqual(
+            get_month_range_for_goal(today, "year"),
+            (date(2022, 1, 1), date(2022, 5, 1)),
+        )
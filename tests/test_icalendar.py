@@ -0,0 +1,162 @@
+import datetime
+import unittest
+from typing import List
+
+from base.database import Database, Row
+from base.icalendar import (
+    _escape,
+    _fold,
+    _import_recurring_event,
+    _parse_events,
+    _unescape,
+    _unfold,
+    export_calendar,
+    import_calendar,
+)
+from tests import scratch_database
+
+
+class ICalendarTests(unittest.TestCase):
+    def test_fold_and_unfold(self):
+        line = "DESCRIPTION:" + "é" * 100
+        folded = _fold(line)
+        self.assertTrue(
+            all(len(part.encode("utf8")) <= 75 for part in folded.split("\r\n"))
+        )
+        self.assertEqual(list(_unfold(folded.split("\r\n"))), [line])
+
+    def test_escape_and_unescape(self):
+        text = "a, b; c\\d\nsecond line"
+        self.assertEqual(_escape(text), r"a\, b\; c\\d\nsecond line")
+        self.assertEqual(_unescape(_escape(text)), text)
+
+    def test_parse_events(self):
+        lines = [
+            "BEGIN:VCALENDAR",
+            "BEGIN:VEVENT",
+            "DTSTART;TZID=America/New_York:20240103T090000",
+            "SUMMARY:Standup",
+            "BEGIN:VALARM",
+            "DESCRIPTION:Reminder",
+            "END:VALARM",
+            "END:VEVENT",
+            "END:VCALENDAR",
+        ]
+        self.assertEqual(
+            list(_parse_events(lines)),
+            [
+                {
+                    "DTSTART": [({"TZID": "America/New_York"}, "20240103T090000")],
+                    "SUMMARY": [({}, "Standup")],
+                }
+            ],
+        )
+
+    def test_import_recurring_event(self):
+        component = {
+            "DTSTART": [({}, "20240103T090000")],
+            "DTEND": [({}, "20240103T091500")],
+            "RRULE": [({}, "FREQ=WEEKLY;WKST=SU;COUNT=3;BYDAY=WE")],
+            "EXDATE": [({}, "20240110T090000")],
+            "SUMMARY": [({}, "Standup")],
+        }
+        row, exdates = _import_recurring_event(component)
+        self.assertEqual(row["recurrence"], "weekly")
+        self.assertEqual(row["start"], datetime.time(9, 0))
+        self.assertEqual(row["end"], datetime.time(9, 15))
+        self.assertEqual(row["recurrence_start"], datetime.date(2024, 1, 3))
+        self.assertEqual(row["recurrence_end"], datetime.date(2024, 1, 17))
+        self.assertEqual(exdates, [datetime.date(2024, 1, 10)])
+
+        component["RRULE"] = [({}, "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR")]
+        self.assertEqual(
+            _import_recurring_event(component)[0]["recurrence"], "weekdays"
+        )
+
+        component["RRULE"] = [({}, "FREQ=MONTHLY")]
+        self.assertIsNone(_import_recurring_event(component))
+
+    def test_export_and_import_calendar(self):
+        with scratch_database() as source, scratch_database() as target:
+            source.insert(
+                "calendar_events",
+                {
+                    "start_date": datetime.date(2024, 1, 5),
+                    "end_date": datetime.date(2024, 1, 5),
+                    "start": datetime.time(18, 30),
+                    "end": datetime.time(21, 0),
+                    "travel_time": 20,
+                    "title": "Dinner; with friends",
+                    "description": "",
+                    "location": "12 Main St, Springfield",
+                    "maybe": True,
+                },
+            )
+            source.insert(
+                "calendar_events",
+                {
+                    "start_date": datetime.date(2024, 2, 10),
+                    "end_date": datetime.date(2024, 2, 12),
+                    "start": None,
+                    "end": None,
+                    "travel_time": 0,
+                    "title": "Trip",
+                    "description": "Pack:\n- boots, tent",
+                    "location": "",
+                    "maybe": False,
+                },
+            )
+            pk = source.insert(
+                "calendar_recurring_events",
+                {
+                    "start": datetime.time(9, 0),
+                    "end": datetime.time(9, 15),
+                    "title": "Standup",
+                    "description": "",
+                    "location": "",
+                    "recurrence": "weekdays",
+                    "recurrence_start": datetime.date(2024, 1, 1),
+                    "recurrence_end": datetime.date(2024, 3, 29),
+                },
+            )
+            # One cancelled and one rescheduled occurrence.
+            source.insert(
+                "calendar_recurring_event_exceptions",
+                {"recurring_event": pk, "date": datetime.date(2024, 1, 10)},
+            )
+            source.insert(
+                "calendar_recurring_event_exceptions",
+                {
+                    "recurring_event": pk,
+                    "date": datetime.date(2024, 1, 17),
+                    "start": datetime.time(10, 0),
+                    "end": datetime.time(10, 30),
+                },
+            )
+
+            counts = import_calendar(target, list(export_calendar(source)))
+            self.assertEqual(
+                counts,
+                {
+                    "calendar_events": 2,
+                    "calendar_recurring_events": 1,
+                    "calendar_recurring_event_exceptions": 2,
+                    "skipped": 0,
+                },
+            )
+            for table in [
+                "calendar_events",
+                "calendar_recurring_events",
+                "calendar_recurring_event_exceptions",
+            ]:
+                self.assertEqual(_get_rows(target, table), _get_rows(source, table))
+
+
+def _get_rows(db: Database, table: str) -> List[Row]:
+    # The IDs of the recurring events match because both databases start out empty.
+    rows = db.select(table, order_by="id")
+    ignored = {"id", "created_at", "last_updated_at"}
+    rows = [{k: v for k, v in row.items() if k not in ignored} for row in rows]
+    if table == "calendar_recurring_event_exceptions":
+        rows.sort(key=lambda row: row["date"])
+    return rows
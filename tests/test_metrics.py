@@ -0,0 +1,119 @@
+import datetime
+import unittest
+
+from base import books
+from base.metrics import (
+    METRICS_MAP,
+    D,
+    _get_cached_values,
+    derive_series,
+    get_metric,
+    range_metric_books_read,
+    refresh_metric_cache,
+)
+from tests import scratch_database
+
+
+class MetricsTests(unittest.TestCase):
+    def test_derive_series(self):
+        series = derive_series((1.0, 2.0, None, 4.0, 5.0, 6.0), 2)
+
+        self.assertEqual(series["rolling_mean"], (None, 1.5, None, None, 4.5, 5.5))
+        self.assertEqual(series["cumulative"], (1.0, 3.0, 3.0, 7.0, 12.0, 18.0))
+        self.assertEqual(series["percentile_50"], (None, 1.5, None, None, 4.5, 5.5))
+        self.assertAlmostEqual(series["percentile_10"][1], 1.1)
+        self.assertAlmostEqual(series["percentile_90"][5], 5.9)
+        self.assertEqual(series["yoy_delta"], (None,) * 6)
+
+    def test_derive_series_year_over_year(self):
+        values = tuple(float(i) for i in range(14))
+        series = derive_series(values, 3)
+
+        self.assertEqual(series["yoy_delta"], (None,) * 12 + (12.0, 12.0))
+        self.assertEqual(series["rolling_mean"][:3], (None, None, 1.0))
+
+    def test_range_metric_books_read(self):
+        with scratch_database() as db:
+            rows = [
+                # Spans the boundary between January and February.
+                (datetime.date(2022, 1, 20), datetime.date(2022, 2, 10), False),
+                (datetime.date(2022, 2, 1), datetime.date(2022, 2, 5), False),
+                (datetime.date(2022, 1, 5), datetime.date(2022, 3, 1), True),
+                (datetime.date(2022, 2, 15), None, False),
+            ]
+            for date_started, date_ended, abandoned in rows:
+                book = db.insert(
+                    "books",
+                    {
+                        "title": "T",
+                        "authors": "A",
+                        "fictional": False,
+                        "pages": 300,
+                    },
+                )
+                db.insert(
+                    "book_entries",
+                    {
+                        "book": book,
+                        "date_started": date_started,
+                        "date_ended": date_ended,
+                        "abandoned": abandoned,
+                    },
+                )
+
+            values = range_metric_books_read(
+                db, datetime.date(2021, 12, 1), datetime.date(2022, 3, 1)
+            )
+            expected = [
+                D(
+                    sum(b["value_in_interval"] for b in books.list_books(db, y, m)),
+                    places=2,
+                )
+                for y, m in [(2021, 12), (2022, 1), (2022, 2), (2022, 3)]
+            ]
+
+        self.assertEqual(values, expected)
+        self.assertGreater(values[1], 0)
+        self.assertGreater(values[2], 0)
+
+    def test_refresh_metric_cache(self):
+        metric = METRICS_MAP["books_read"]
+        january = datetime.date(2022, 1, 1)
+        february = datetime.date(2022, 2, 1)
+        with scratch_database() as db:
+            book = db.insert(
+                "books",
+                {"title": "T", "authors": "A", "fictional": False, "pages": 300},
+            )
+            entry = db.insert(
+                "book_entries",
+                {
+                    "book": book,
+                    "date_started": datetime.date(2022, 1, 20),
+                    "date_ended": datetime.date(2022, 2, 10),
+                    "abandoned": False,
+                },
+            )
+            # Backdate the rows so that the cache is not stale as soon as it is
+            # written, which it would be if both happened in the same second.
+            db.sql("UPDATE books SET last_updated_at = 1")
+            db.sql("UPDATE book_entries SET last_updated_at = 1")
+
+            self.assertGreater(refresh_metric_cache(db, february), 0)
+            self.assertEqual(refresh_metric_cache(db, february), 0)
+            cached = _get_cached_values(db, [metric], january, february)
+            self.assertGreater(cached["books_read"][january], 0)
+            self.assertGreater(cached["books_read"][february], 0)
+
+            # A deletion does not change any timestamp, but it still makes the
+            # cache stale.
+            db.delete_by_pk("book_entries", entry)
+            cached = _get_cached_values(db, [metric], january, february)
+            self.assertEqual(cached["books_read"], {})
+            values = dict(get_metric(db, "books_read")["values"])
+            self.assertEqual(values["2022-01-01"], 0)
+            self.assertEqual(values["2022-02-01"], 0)
+
+            self.assertGreater(refresh_metric_cache(db, february), 0)
+            cached = _get_cached_values(db, [metric], january, february)
+            self.assertEqual(cached["books_read"], {january: 0, february: 0})
@@ -0,0 +1,96 @@
+import datetime
+import unittest
+
+from base import schema
+from base.exceptions import KhaganateError
+from base.tasks import (
+    LAST_UPDATED_AT_OVERALL_TRIGGERS,
+    _diff_task,
+    backfill_last_updated_at_overall,
+    create_task,
+    get_task,
+    list_tasks,
+)
+from tests import scratch_database
+
+
+class TasksTests(unittest.TestCase):
+    def test_diff_task(self):
+        task = {
+            "id": 1,
+            "title": "Write tests",
+            "deadline": datetime.date(2024, 1, 1),
+            "priority": 2,
+            "is_machine_created": False,
+        }
+        self.assertEqual(
+            _diff_task(
+                task,
+                {
+                    "id": 1,
+                    "title": "Write tests",
+                    "deadline": "2024-01-01",
+                    "priority": 2,
+                    "is_machine_created": False,
+                },
+            ),
+            {},
+        )
+        self.assertEqual(
+            _diff_task(task, {"deadline": "2024-01-02", "priority": 0}),
+            {"deadline": datetime.date(2024, 1, 2), "priority": 0},
+        )
+        self.assertEqual(_diff_task(task, {"deadline": None}), {"deadline": None})
+
+        with self.assertRaises(KhaganateError):
+            _diff_task(task, {"title; DROP TABLE tasks": "x"})
+
+    def test_last_updated_at_overall(self):
+        with scratch_database() as db:
+            # The migration does not create the triggers, so the column starts out
+            # NULL, as it would for tasks that predate it.
+            first = db.insert("tasks", {"title": "First"})
+            second = db.insert("tasks", {"title": "Second"})
+            db.sql(
+                "UPDATE tasks SET last_updated_at = 100 WHERE id = :id",
+                {"id": first},
+            )
+            db.sql(
+                "UPDATE tasks SET last_updated_at = 200 WHERE id = :id",
+                {"id": second},
+            )
+            comment = db.insert("task_comments", {"task": first, "text": "..."})
+            db.sql(
+                "UPDATE task_comments SET last_updated_at = 300 WHERE id = :id",
+                {"id": comment},
+            )
+
+            self.assertEqual(
+                [task["id"] for task in list_tasks(db, updated_since=150)], [second]
+            )
+            # Reads fall back to the task's own update time.
+            self.assertEqual(get_task(db, second)["last_updated_at_overall"], 200)
+            task = create_task(db, {"title": "Third"})
+            self.assertEqual(task["last_updated_at_overall"], task["last_updated_at"])
+            db.delete("tasks", where="id = :id", values={"id": task["id"]})
+
+            self.assertEqual(backfill_last_updated_at_overall(db), 2)
+            self.assertEqual(
+                schema.get_missing_triggers(db, LAST_UPDATED_AT_OVERALL_TRIGGERS),
+                [],
+            )
+            self.assertEqual(
+                [task["id"] for task in list_tasks(db, updated_since=150)],
+                [first, second],
+            )
+            self.assertEqual(
+                [task["id"] for task in list_tasks(db, order="recent")],
+                [first, second],
+            )
+            self.assertEqual(
+                [task["id"] for task in list_tasks(db, order="recent", limit=1)],
+                [first],
+            )
+
+            with self.assertRaises(KhaganateError):
+                list_tasks(db, order="recent", after=first)
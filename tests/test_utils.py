@@ -155,3 +155,27 @@ class UtilsTests(unittest.TestCase):
         self.assertEqual(utils.format_time(time(hour=7, minute=3)), "7:03\xa0AM")
         self.assertEqual(utils.format_time(time(hour=0, minute=0)), "12:00\xa0AM")
         self.assertEqual(utils.format_time(time(hour=12, minute=0)), "12:00\xa0PM")
+
+    def test_month_range(self):
+        self.assertEqual(
+            list(utils.month_range(date(2021, 11, 15), date(2022, 2, 1))),
+            [date(2021, 11, 1), date(2021, 12, 1), date(2022, 1, 1), date(2022, 2, 1)],
+        )
+        self.assertEqual(
+            list(utils.month_range(date(2022, 3, 1), date(2022, 3, 31))),
+            [date(2022, 3, 1)],
+        )
+        self.assertEqual(
+            list(utils.month_range(date(2022, 3, 1), date(2022, 2, 1))), []
+        )
+
+    def test_make_in_condition(self):
+        values = {"start": "2022-01-01"}
+        self.assertEqual(
+            utils.make_in_condition("quizzes.id", [4, 2], values),
+            "quizzes.id IN (:quizzes_id0, :quizzes_id1)",
+        )
+        self.assertEqual(
+            values, {"start": "2022-01-01", "quizzes_id0": 4, "quizzes_id1": 2}
+        )
+        self.assertEqual(utils.make_in_condition("id", [], values), "0")